@@ -4,7 +4,10 @@ Implementa notificaciones automáticas basadas en umbrales configurables
 Integrado con NotificationService para alertas en tiempo real
 """
 import os
+import copy
+import asyncio
 import logging
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Callable
 from dataclasses import dataclass
@@ -305,55 +308,116 @@ class AlertService:
         """
         alerts_generated = []
         
-        for alert_type, rule in self.alert_rules.items():
-            if not rule.enabled:
-                continue
-            
-            # Verificar cooldown
-            if self._is_in_cooldown(alert_type, rule.cooldown_minutes):
-                continue
-            
+        for alert_type, rule in self._get_due_rules():
             try:
-                alert = self._check_single_alert(rule)
-                if alert:
-                    # Persistir alerta en base de datos
-                    self._persist_alert_to_database(alert)
-                    
-                    alerts_generated.append(alert)
-                    self.notifier.notify(alert)
-                    self._update_alert_history(alert_type)
-                    
+                outcome = self._check_single_alert(rule)
             except Exception as e:
-                error_msg = str(e)
-                
-                # En modo desarrollo, ignorar errores de hash/blockchain
-                if self.ignore_hash_errors and any(keyword in error_msg.lower() for keyword in 
-                    ['hash', 'blockchain', 'previous_hash', 'current_hash', 'block_number']):
-                    logger.warning(f"Ignoring hash error in development mode for {alert_type.value}: {error_msg}")
-                    continue
-                
-                logger.error(f"Error checking alert {alert_type.value}: {error_msg}")
-                
-                # Crear alerta sobre el error del sistema de alertas
-                error_alert = AlertEvent(
-                    alert_type=AlertType.SYSTEM_OVERLOAD,  # Usar tipo existente
-                    level=AlertLevel.WARNING,
-                    title=f"Alert System Error: {alert_type.value}",
-                    message=f"Error checking alert rule: {error_msg}",
-                    current_value=1,
-                    threshold_value=0,
-                    timestamp=datetime.utcnow(),
-                    metadata={"original_error": error_msg, "alert_type": alert_type.value}
-                )
-                
-                # Persistir error alert también
-                self._persist_alert_to_database(error_alert)
-                
-                alerts_generated.append(error_alert)
-                self.notifier.notify(error_alert)
+                outcome = e
+            
+            self._process_check_outcome(alert_type, outcome, alerts_generated)
         
         return alerts_generated
     
+    async def check_all_alerts_async(self, session_factory: Callable[[], Session]) -> List[AlertEvent]:
+        """
+        Variante concurrente de check_all_alerts: las reglas se evalúan en paralelo con
+        asyncio.gather (cada una en un hilo del executor con su propia sesión de session_factory)
+        y luego se persisten y notifican en orden sobre self.db
+        """
+        loop = asyncio.get_running_loop()
+        due_rules = self._get_due_rules()
+        
+        outcomes = await asyncio.gather(
+            *(loop.run_in_executor(None, self._check_rule_isolated, rule, session_factory) for _, rule in due_rules),
+            return_exceptions=True
+        )
+        
+        def process_outcomes() -> List[AlertEvent]:
+            alerts_generated = []
+            for (alert_type, _), outcome in zip(due_rules, outcomes):
+                self._process_check_outcome(alert_type, outcome, alerts_generated)
+            return alerts_generated
+        
+        # Persistencia y notificaciones también son bloqueantes: fuera del event loop
+        return await loop.run_in_executor(None, process_outcomes)
+    
+    def _get_due_rules(self) -> List[tuple]:
+        """Reglas habilitadas que no están en cooldown, como pares (alert_type, rule)"""
+        return [
+            (alert_type, rule)
+            for alert_type, rule in self.alert_rules.items()
+            if rule.enabled and not self._is_in_cooldown(alert_type, rule.cooldown_minutes)
+        ]
+    
+    def _check_rule_isolated(self, rule: AlertRule, session_factory: Callable[[], Session]) -> Optional[AlertEvent]:
+        """Evalúa una regla con una sesión propia (Session no es segura entre hilos)"""
+        db = session_factory()
+        
+        try:
+            # Copias superficiales que solo cambian la sesión; reglas e historial se comparten
+            checker = copy.copy(self)
+            checker.db = db
+            checker.metrics_service = copy.copy(self.metrics_service)
+            checker.metrics_service.db = db
+            
+            return checker._check_single_alert(rule)
+        finally:
+            db.close()
+    
+    def _process_check_outcome(self, alert_type: AlertType, outcome: Any, alerts_generated: List[AlertEvent]) -> None:
+        """
+        Persiste y notifica el resultado de una regla (AlertEvent, None o la excepción
+        que produjo la verificación) y lo agrega a alerts_generated
+        """
+        try:
+            if isinstance(outcome, Exception):
+                raise outcome
+            
+            if outcome:
+                # Persistir alerta en base de datos
+                self._persist_alert_to_database(outcome)
+                
+                alerts_generated.append(outcome)
+                self.notifier.notify(outcome)
+                self._update_alert_history(alert_type)
+                
+        except Exception as e:
+            error_msg = str(e)
+            
+            # En modo desarrollo, ignorar errores de hash/blockchain
+            if self.ignore_hash_errors and any(keyword in error_msg.lower() for keyword in 
+                ['hash', 'blockchain', 'previous_hash', 'current_hash', 'block_number']):
+                logger.warning(f"Ignoring hash error in development mode for {alert_type.value}: {error_msg}")
+                return
+            
+            logger.error(f"Error checking alert {alert_type.value}: {error_msg}")
+            
+            # Crear alerta sobre el error del sistema de alertas
+            error_alert = AlertEvent(
+                alert_type=AlertType.SYSTEM_OVERLOAD,  # Usar tipo existente
+                level=AlertLevel.WARNING,
+                title=f"Alert System Error: {alert_type.value}",
+                message=f"Error checking alert rule: {error_msg}",
+                current_value=1,
+                threshold_value=0,
+                timestamp=datetime.utcnow(),
+                metadata={"original_error": error_msg, "alert_type": alert_type.value}
+            )
+            
+            # Persistir error alert también
+            self._persist_alert_to_database(error_alert)
+            
+            alerts_generated.append(error_alert)
+            self.notifier.notify(error_alert)
+    
+    @staticmethod
+    def count_by_level(alerts: List[AlertEvent]) -> Dict[str, int]:
+        """
+        Cuenta alertas por nivel en una sola pasada (sin listas intermedias por nivel)
+        Retorna {nivel: cantidad}, p.ej. {"critical": 1, "warning": 2}
+        """
+        return dict(Counter(alert.level.value for alert in alerts))
+    
     def _check_single_alert(self, rule: AlertRule) -> Optional[AlertEvent]:
         """Verifica una regla de alerta específica"""
         
@@ -448,10 +448,9 @@ Detalles del Evento:
                 logger.warning(f"Payment {payment.id} has no client_account_id")
                 return {"success": False, "error": "No client account ID"}
             
-            # Obtener cuenta del cliente
-            client_account = self.db.query(ClientAccount).filter(
-                ClientAccount.id == payment.client_account_id
-            ).first()
+            # Obtener cuenta del cliente (Session.get usa el identity map: sin SQL si el
+            # llamador ya la cargó, p.ej. con joinedload/selectinload de Payment.client_account)
+            client_account = self.db.get(ClientAccount, payment.client_account_id)
             
             if not client_account:
                 logger.error(f"Client account {payment.client_account_id} not found")
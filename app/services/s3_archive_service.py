@@ -13,8 +13,6 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
 from botocore.exceptions import ClientError, NoCredentialsError
 from dataclasses import dataclass
-import tempfile
-from pathlib import Path
 
 from models import AuditLog, SecurityAlert, WebhookEvent
 
@@ -442,17 +440,12 @@ class S3ArchiveService:
         json_content = json.dumps(data, indent=2, ensure_ascii=False)
         
         if compress:
-            # Comprimir con gzip
-            with tempfile.NamedTemporaryFile() as temp_file:
-                with gzip.open(temp_file.name, 'wt', encoding='utf-8') as gz_file:
-                    gz_file.write(json_content)
-                
-                temp_file.seek(0)
-                content = temp_file.read()
-                
-                # Agregar extensión .gz al key
-                s3_key += '.gz'
-                content_type = 'application/gzip'
+            # Comprimir con gzip en memoria (sin ida y vuelta por archivo temporal)
+            content = gzip.compress(json_content.encode('utf-8'))
+            
+            # Agregar extensión .gz al key
+            s3_key += '.gz'
+            content_type = 'application/gzip'
         else:
             content = json_content.encode('utf-8')
             content_type = 'application/json'
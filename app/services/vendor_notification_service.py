@@ -4,10 +4,16 @@ Maneja notificaciones de pagos aprobados con protección anti-duplicados
 """
 import os
 import json
+import atexit
+import time
 import smtplib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Optional, Any
+from sqlalchemy import inspect, select, update, delete, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from dataclasses import dataclass
 
@@ -15,6 +21,17 @@ from models import Payment, PaymentEvent, ClientAccount
 
 logger = logging.getLogger("vendor_notification_service")
 
+# Pool de envío SMTP en segundo plano: el handshake con el servidor de correo queda
+# fuera del camino crítico (y fuera de la sesión de BD) cuando se pide background_email
+_EMAIL_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vendor_email")
+# Al salir del proceso se esperan los envíos encolados en lugar de perderlos
+atexit.register(_EMAIL_EXECUTOR.shutdown, wait=True)
+
+# INSERT con ON CONFLICT por motor; la deduplicación atómica requiere además el índice
+# único parcial ux_payment_event_notification_sent (scripts/update_db_for_tagging.py)
+_UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+NOTIFICATION_DEDUP_INDEX = "ux_payment_event_notification_sent"
+
 @dataclass
 class VendorNotification:
     """Estructura de notificación para vendedor"""
@@ -32,6 +49,14 @@ class VendorNotificationService:
     Maneja notificaciones de dashboard y email con protección anti-duplicados
     """
     
+    # Cache de estadísticas compartido entre instancias (por URL de BD): evita repetir
+    # los COUNT sobre payment_events en llamadas seguidas; se invalida al registrar eventos
+    _STATS_CACHE_TTL = 30  # segundos
+    _stats_cache: Dict[str, Any] = {}
+    
+    # Por URL de BD: si existe el índice único que permite reclamar la notificación con ON CONFLICT
+    _claim_support: Dict[str, bool] = {}
+    
     def __init__(self, db: Session):
         self.db = db
         
@@ -44,18 +69,36 @@ class VendorNotificationService:
         
         logger.info("VendorNotificationService initialized")
     
-    def notify_payment_approved(self, payment: Payment) -> Dict[str, Any]:
+    def notify_payment_approved(self, payment: Payment, background_email: bool = False) -> Dict[str, Any]:
         """
         Disparador único: Notifica pago aprobado desde el backend
+        
+        Con background_email=True el envío SMTP se encola en un hilo y el resultado
+        solo indica si el email quedó encolado (email_queued); el hilo registra la entrega
+        en el evento notification_sent o, si falla, libera el reclamo para permitir un reintento
         """
+        sent_event_id = None
+        dashboard_event_id = None
+        
         try:
-            # 1. Verificar protección anti-duplicados
-            if self._is_notification_already_sent(payment.id):
+            # 1. Protección anti-duplicados: reclamar el evento notification_sent en un solo
+            # INSERT ... ON CONFLICT DO NOTHING (sin SELECT previo y sin carrera entre webhooks)
+            use_claim = self._supports_notification_claim()
+            if use_claim:
+                sent_event_id = self._claim_notification(payment.id)
+                already_sent = sent_event_id is None
+                existing_id = self._get_sent_notification_id(payment.id) if already_sent else None
+            else:
+                existing_id = self._get_sent_notification_id(payment.id)
+                already_sent = existing_id is not None
+            
+            if already_sent:
                 logger.info(f"Notification already sent for payment {payment.id}")
                 return {
                     "success": True,
                     "message": "Notification already sent (anti-duplicate protection)",
-                    "payment_id": payment.id
+                    "payment_id": payment.id,
+                    "notification_sent_id": existing_id
                 }
             
             # 2. Obtener datos del cliente
@@ -68,31 +111,58 @@ class VendorNotificationService:
             # 3. Crear evento de notificación en dashboard
             notification_data = self._create_notification_data(payment, client_account)
             
-            # 4. Registrar evento para dashboard
+            # 4. Registrar evento para dashboard. Si no hay envío SMTP síncrono se confirma junto con
+            # el evento notification_sent (un solo commit); si lo hay, se confirma antes para no
+            # mantener abierta la transacción (y el lock de escritura en SQLite) durante el envío
+            owner_email = client_account and hasattr(client_account, 'owner_email') and client_account.owner_email
+            sync_email = bool(owner_email or self.from_email) and not background_email
             dashboard_event = self._create_payment_event(
                 payment_id=payment.id,
                 event_type="payment_approved",
-                event_data=notification_data
+                event_data=notification_data,
+                commit=sync_email
             )
+            dashboard_event_id = dashboard_event.id
             
             # 5. Enviar email SMTP si está configurado
             email_result = None
-            if client_account and hasattr(client_account, 'owner_email') and client_account.owner_email:
-                email_result = self._send_email_notification(payment, client_account, notification_data)
+            if owner_email:
+                email_result = self._send_email_notification(payment, client_account, notification_data, background_email)
             elif self.from_email:
                 # Fallback: usar email por defecto
-                email_result = self._send_email_notification(payment, None, notification_data)
+                email_result = self._send_email_notification(payment, None, notification_data, background_email)
             
-            # 6. Marcar notificación como enviada
-            sent_event = self._create_payment_event(
-                payment_id=payment.id,
-                event_type="notification_sent",
-                event_data={
-                    "dashboard_notification_id": dashboard_event.id,
-                    "email_sent": email_result.get("success", False) if email_result else False,
-                    "email_error": email_result.get("error") if email_result and not email_result.get("success") else None
-                }
-            )
+            email_queued = bool(email_result and email_result.get("queued"))
+            email_sent = bool(email_result and email_result.get("success") and not email_queued)
+            
+            # 6. Marcar notificación como enviada (completa el evento reclamado en el paso 1)
+            sent_event_data = {
+                "dashboard_notification_id": dashboard_event.id,
+                "email_sent": email_sent,
+                "email_queued": email_queued,
+                "email_error": email_result.get("error") if email_result and not email_result.get("success") else None
+            }
+            if use_claim:
+                self._complete_notification(sent_event_id, sent_event_data)
+            else:
+                sent_event_id = self._create_payment_event(
+                    payment_id=payment.id,
+                    event_type="notification_sent",
+                    event_data=sent_event_data
+                ).id
+            
+            # 7. Encolar la entrega SMTP una vez confirmado el evento que el hilo actualizará
+            if email_queued:
+                _EMAIL_EXECUTOR.submit(
+                    self._deliver_queued_email,
+                    self.db.get_bind(),
+                    sent_event_id,
+                    sent_event_data,
+                    email_result["to_email"],
+                    email_result["subject"],
+                    email_result.pop("smtp_message"),
+                    payment.id
+                )
             
             logger.info(f"Vendor notification completed for payment {payment.id}")
             
@@ -100,29 +170,99 @@ class VendorNotificationService:
                 "success": True,
                 "payment_id": payment.id,
                 "dashboard_notification_id": dashboard_event.id,
-                "notification_sent_id": sent_event.id,
-                "email_sent": email_result.get("success", False) if email_result else False,
+                "notification_sent_id": sent_event_id,
+                "email_sent": email_sent,
+                "email_queued": email_queued,
                 "notification_data": notification_data
             }
             
         except Exception as e:
             logger.error(f"Error in vendor notification for payment {payment.id}: {str(e)}")
+            if sent_event_id is not None:
+                # Liberar el reclamo para que un reintento pueda volver a notificar
+                self._release_notification_claim(sent_event_id, dashboard_event_id)
             return {
                 "success": False,
                 "error": str(e),
                 "payment_id": payment.id
             }
     
-    def _is_notification_already_sent(self, payment_id: int) -> bool:
+    def _get_sent_notification_id(self, payment_id: int) -> Optional[int]:
         """
-        Protección anti-duplicados: Verifica si ya se envió notificación
+        Protección anti-duplicados: id del evento notification_sent del pago (None si no existe)
+        """
+        return self.db.execute(
+            select(PaymentEvent.id).where(
+                PaymentEvent.payment_id == payment_id,
+                PaymentEvent.event_type == "notification_sent"
+            ).limit(1)
+        ).scalar()
+    
+    def _supports_notification_claim(self) -> bool:
+        """
+        Indica si el motor admite ON CONFLICT y la BD tiene el índice único de deduplicación
+        (se consulta el catálogo una vez por proceso y URL)
+        """
+        bind = self.db.get_bind()
+        cache_key = str(bind.url)
+        supported = self._claim_support.get(cache_key)
+        if supported is None:
+            supported = bind.dialect.name in _UPSERT_INSERTS and any(
+                index["name"] == NOTIFICATION_DEDUP_INDEX
+                for index in inspect(bind).get_indexes("payment_events")
+            )
+            if not supported:
+                logger.warning(f"{NOTIFICATION_DEDUP_INDEX} not available - using SELECT-based anti-duplicate check")
+            self._claim_support[cache_key] = supported
+        return supported
+    
+    def _claim_notification(self, payment_id: int) -> Optional[int]:
+        """
+        Inserta el evento notification_sent si no existe; devuelve su id o None si ya estaba
+        """
+        upsert = _UPSERT_INSERTS[self.db.get_bind().dialect.name]
+        stmt = (
+            upsert(PaymentEvent)
+            .values(payment_id=payment_id, event_type="notification_sent", event_data="{}")
+            .on_conflict_do_nothing(
+                index_elements=[PaymentEvent.payment_id],
+                # Predicado literal: PostgreSQL no infiere el índice parcial con un parámetro
+                index_where=text("event_type = 'notification_sent'")
+            )
+            .returning(PaymentEvent.id)
+        )
+        return self.db.execute(stmt).scalar()
+    
+    def _complete_notification(self, sent_event_id: int, event_data: Dict[str, Any]):
+        """
+        Registra el resultado de la notificación en el evento reclamado
+        """
+        self.db.execute(
+            update(PaymentEvent)
+            .where(PaymentEvent.id == sent_event_id)
+            .values(event_data=json.dumps(event_data, default=str), processed_at=datetime.utcnow())
+        )
+        self.db.commit()
+        VendorNotificationService._stats_cache.clear()
+    
+    def _release_notification_claim(self, sent_event_id: int, dashboard_event_id: Optional[int] = None):
         """
-        existing_notification = self.db.query(PaymentEvent).filter(
-            PaymentEvent.payment_id == payment_id,
-            PaymentEvent.event_type == "notification_sent"
-        ).first()
+        Elimina un reclamo de notificación que no llegó a completarse junto con su evento de dashboard
         
-        return existing_notification is not None
+        El borrado va en un SAVEPOINT: lo pendiente del llamador no se descarta (solo se revierte
+        si la transacción ya quedó inutilizable por un flush fallido)
+        """
+        event_ids = [event_id for event_id in (sent_event_id, dashboard_event_id) if event_id is not None]
+        try:
+            if not self.db.is_active:
+                self.db.rollback()
+            with self.db.begin_nested():
+                self.db.execute(delete(PaymentEvent).where(PaymentEvent.id.in_(event_ids)))
+            self.db.commit()
+            VendorNotificationService._stats_cache.clear()
+        except Exception as e:
+            logger.error(f"Error releasing notification claim {sent_event_id}: {str(e)}")
+            self.db.rollback()
     
     def _create_notification_data(self, payment: Payment, client_account: ClientAccount = None) -> Dict[str, Any]:
         """
@@ -141,9 +281,18 @@ class VendorNotificationService:
             "notification_id": f"notif_{payment.id}_{int(datetime.utcnow().timestamp())}"
         }
     
-    def _create_payment_event(self, payment_id: int, event_type: str, event_data: Dict[str, Any]) -> PaymentEvent:
+    def _create_payment_event(
+        self,
+        payment_id: int,
+        event_type: str,
+        event_data: Dict[str, Any],
+        commit: bool = True
+    ) -> PaymentEvent:
         """
         Crea un evento de pago en la base de datos
+        
+        Con commit=False solo se hace flush (el id queda asignado) y el evento se confirma
+        con el siguiente commit de la sesión
         """
         payment_event = PaymentEvent(
             payment_id=payment_id,
@@ -153,7 +302,11 @@ class VendorNotificationService:
         )
         
         self.db.add(payment_event)
-        self.db.commit()
+        if commit:
+            self.db.commit()
+            VendorNotificationService._stats_cache.clear()
+        else:
+            self.db.flush()
         
         return payment_event
     
@@ -161,10 +314,14 @@ class VendorNotificationService:
         self, 
         payment: Payment, 
         client_account: ClientAccount = None,
-        notification_data: Dict[str, Any] = None
+        notification_data: Dict[str, Any] = None,
+        background: bool = False
     ) -> Dict[str, Any]:
         """
         Email SMTP Simple: Envía email en texto plano
+        
+        El mensaje se arma en el hilo llamador (lee atributos ORM); con background=True
+        no se envía: se devuelve en smtp_message para encolar la entrega en _EMAIL_EXECUTOR
         """
         try:
             if not all([self.smtp_server, self.from_email]):
@@ -213,14 +370,36 @@ Notificación automática del sistema
             # Crear mensaje
             message = f"Subject: {subject}\r\nFrom: {self.from_email}\r\nTo: {to_email}\r\n\r\n{body}"
             
-            # Enviar email
+            if background:
+                return {
+                    "success": True,
+                    "queued": True,
+                    "to_email": to_email,
+                    "subject": subject,
+                    "smtp_message": message
+                }
+            
+            return self._deliver_email(to_email, subject, message, payment.id)
+            
+        except Exception as e:
+            logger.error(f"Error preparing email notification: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def _deliver_email(self, to_email: str, subject: str, message: str, payment_id: int) -> Dict[str, Any]:
+        """
+        Entrega SMTP de un mensaje ya armado (no accede a la sesión de BD)
+        """
+        try:
             with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
                 server.starttls()
                 if self.smtp_username and self.smtp_password:
                     server.login(self.smtp_username, self.smtp_password)
                 server.sendmail(self.from_email, [to_email], message.encode('utf-8'))
             
-            logger.info(f"Email notification sent to {to_email} for payment {payment.id}")
+            logger.info(f"Email notification sent to {to_email} for payment {payment_id}")
             
             return {
                 "success": True,
@@ -236,6 +415,40 @@ Notificación automática del sistema
                 "error": str(e)
             }
     
+    def _deliver_queued_email(
+        self,
+        bind,
+        sent_event_id: int,
+        sent_event_data: Dict[str, Any],
+        to_email: str,
+        subject: str,
+        message: str,
+        payment_id: int
+    ):
+        """
+        Entrega en segundo plano y registra el resultado con una sesión propia: si el envío
+        falla se eliminan el evento notification_sent y su evento de dashboard para que un
+        reintento vuelva a notificar sin duplicar la notificación del dashboard
+        """
+        result = self._deliver_email(to_email, subject, message, payment_id)
+        
+        try:
+            with Session(bind=bind) as db, db.begin():
+                if result["success"]:
+                    event_data = dict(sent_event_data, email_sent=True, email_queued=False)
+                    db.execute(
+                        update(PaymentEvent)
+                        .where(PaymentEvent.id == sent_event_id)
+                        .values(event_data=json.dumps(event_data, default=str), processed_at=datetime.utcnow())
+                    )
+                else:
+                    event_ids = [sent_event_id, sent_event_data["dashboard_notification_id"]]
+                    db.execute(delete(PaymentEvent).where(PaymentEvent.id.in_(event_ids)))
+                    logger.warning(f"Queued email failed for payment {payment_id} - notification claim released")
+            VendorNotificationService._stats_cache.clear()
+        except Exception as e:
+            logger.error(f"Error recording queued email result for payment {payment_id}: {str(e)}")
+    
     def get_recent_notifications(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Obtiene las notificaciones recientes para el dashboard
@@ -276,6 +489,11 @@ Notificación automática del sistema
         """
         Obtiene estadísticas de notificaciones para el dashboard
         """
+        cache_key = str(self.db.get_bind().url)
+        cached = self._stats_cache.get(cache_key)
+        if cached and time.monotonic() - cached["timestamp"] < self._STATS_CACHE_TTL:
+            return dict(cached["data"])
+        
         try:
             # Contar notificaciones por tipo
             total_approved = self.db.query(PaymentEvent).filter(
@@ -293,13 +511,16 @@ Notificación automática del sistema
                 PaymentEvent.created_at >= today
             ).count()
             
-            return {
+            stats = {
                 "total_approved_notifications": total_approved,
                 "total_sent_notifications": total_sent,
                 "today_approved": today_approved,
                 "success_rate": (total_sent / total_approved * 100) if total_approved > 0 else 0
             }
             
+            self._stats_cache[cache_key] = {"data": stats, "timestamp": time.monotonic()}
+            return dict(stats)
+            
         except Exception as e:
             logger.error(f"Error getting notification stats: {str(e)}")
             return {
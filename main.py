@@ -10,7 +10,7 @@ from sqlalchemy import create_engine, and_, or_, func
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel, validator
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import json
 import hashlib
 import hmac
@@ -31,6 +31,8 @@ from models import (
     PaymentStatus, AuditAction, ClientAccount, PaymentEvent, CriticalAuditLog
 )
 from services.critical_audit_service import CriticalAuditService, AuditContext, CriticalActions
+from security.response_cache import ResponseCacheMiddleware
+from security.blockchain_audit import BlockchainAuditLogger
 
 # Configuración
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
@@ -108,6 +110,11 @@ Base.metadata.create_all(bind=engine)
 app = FastAPI(title="MercadoPago Enterprise API", version="2.0.0")
 security = HTTPBearer()
 
+# Cache corta (HEALTH_CACHE_TTL) + ETag para los endpoints del dashboard que el monitoreo consulta
+# con alta frecuencia; se registra antes que el middleware de correlation_id para que este
+# también marque las respuestas servidas desde la cache
+app.add_middleware(ResponseCacheMiddleware)
+
 # Montar archivos estáticos para el dashboard
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -276,52 +283,31 @@ class AuditLogger:
             # Verificar si blockchain está habilitado
             is_development = os.getenv("ENVIRONMENT", "development") == "development"
             
-            # Generar hash simple
-            correlation_id = correlation_id or f"audit_{int(time.time())}"
-            hash_data = f"{action.value}:{description}:{performed_by}:{correlation_id}"
-            current_hash = hashlib.sha256(hash_data.encode()).hexdigest()
-            
-            # Obtener último bloque para secuencia
-            previous_hash = "genesis"
-            block_number = 1
-            
-            try:
-                last_audit = db.query(AuditLog).order_by(AuditLog.id.desc()).first()
-                if last_audit and last_audit.current_hash:
-                    previous_hash = last_audit.current_hash
-                    block_number = (last_audit.block_number or 0) + 1
-            except Exception:
-                # Si falla, usar valores por defecto
-                pass
-            
-            audit_log = AuditLog(
-                payment_id=payment_id,
-                action=action.value,
+            # Cabeza de la cadena, hash y reintento ante conflicto de block_number: mismo
+            # camino que BlockchainAuditLogger (un solo escritor de la cadena)
+            audit_log = BlockchainAuditLogger(db).log_action(
+                action=action,
                 description=description,
                 performed_by=performed_by,
-                request_data=json.dumps(request_data) if request_data else None,
-                response_data=json.dumps(response_data) if response_data else None,
+                payment_id=payment_id,
+                request_data=request_data,
+                response_data=response_data,
                 error_message=error_message,
                 ip_address=ip_address,
                 user_agent=user_agent,
-                correlation_id=correlation_id,
-                # Campos blockchain según esquema real
-                previous_hash=previous_hash,
-                current_hash=current_hash,
-                block_number=block_number,
-                is_verified=True,
+                correlation_id=correlation_id or f"audit_{int(time.time())}",
                 blockchain_enabled=not is_development
             )
             
-            db.add(audit_log)
-            db.commit()
-            
             # Log simple sin extra para evitar conflictos
-            print(f"[AUDIT] {action.value} - {description} (Block: {block_number})")
+            print(f"[AUDIT] {action.value} - {description} (Block: {audit_log.block_number})")
                        
         except Exception as e:
             # En caso de error crítico, intentar log básico
             try:
+                # Descartar la transacción fallida antes de escribir el fallback
+                db.rollback()
+                
                 # Hash simple para fallback
                 fallback_hash = hashlib.md5(f"fallback_{int(time.time())}".encode()).hexdigest()
                 
@@ -341,6 +327,7 @@ class AuditLogger:
                 db.commit()
                 print(f"[AUDIT-FALLBACK] {action.value} - Fallback log created")
             except Exception as fallback_error:
+                db.rollback()
                 print(f"[AUDIT-CRITICAL] Cannot create audit log: {fallback_error}")
 
 # Utilidades de Seguridad
@@ -1861,41 +1848,24 @@ async def create_audit_log(
             # Permitir acciones personalizadas para testing
             action = f"CUSTOM_{action.upper()}"
         
-        # Generar hash simple para blockchain
-        import hashlib
-        data_for_hash = f"{action}:{description}:{performed_by}:{correlation_id}"
-        current_hash = hashlib.sha256(data_for_hash.encode()).hexdigest()
-        data_checksum = hashlib.md5(data_for_hash.encode()).hexdigest()
-        
-        # Obtener último bloque para secuencia
-        last_audit = db.query(AuditLog).order_by(AuditLog.id.desc()).first()
-        previous_hash = last_audit.current_hash if last_audit else "genesis"
-        block_number = (last_audit.block_number if last_audit else 0) + 1
-        
-        # Crear log de auditoría directamente con campos correctos del esquema real
-        audit_log = AuditLog(
-            payment_id=payment_id,
+        # Encadenar con la cabeza real de la cadena (reintenta si otro escritor tomó el bloque)
+        audit_log = BlockchainAuditLogger(db).log_action(
             action=action,  # Usar la acción personalizada directamente
             description=f"[MANUAL] {description}",
             performed_by=performed_by,
-            request_data=json.dumps({
+            payment_id=payment_id,
+            request_data={
                 "manual_entry": True,
                 "original_action": action,
                 "source": "POST_endpoint",
                 "body": body
-            }),
+            },
             ip_address=request.client.host,
             correlation_id=correlation_id,
-            # Campos blockchain según esquema real
-            previous_hash=previous_hash,
-            current_hash=current_hash,
-            block_number=block_number,
-            is_verified=True,
             blockchain_enabled=False  # Desarrollo
         )
-        
-        db.add(audit_log)
-        db.commit()
+        block_number = audit_log.block_number
+        current_hash = audit_log.current_hash
         
         # Log simple en consola
         print(f"[MANUAL-AUDIT] {action} - {description} (Block: {block_number}, ID: {correlation_id})")
@@ -2,13 +2,21 @@
 Modelos SQLAlchemy para sistema MercadoPago Enterprise
 Incluye auditoría completa y seguridad reforzada
 """
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, Boolean, Text, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, Boolean, Text, ForeignKey, Index, BigInteger, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime, timedelta
 from enum import Enum
 import uuid
+import json
+
+# orjson es opcional: decodificación más rápida de request_data, con fallback a json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 Base = declarative_base()
 
@@ -38,8 +46,8 @@ class PaymentEvent(Base):
     __tablename__ = 'payment_events'
     
     id = Column(Integer, primary_key=True)
-    payment_id = Column(Integer, ForeignKey('payments.id'), nullable=False, index=True)
-    event_type = Column(String(50), nullable=False, index=True)  # payment_approved, notification_sent, etc.
+    payment_id = Column(Integer, ForeignKey('payments.id'), nullable=False)
+    event_type = Column(String(50), nullable=False)  # payment_approved, notification_sent, etc.
     event_data = Column(Text, nullable=True)  # JSON con datos del evento
     created_at = Column(DateTime, nullable=False, default=func.now())
     processed_at = Column(DateTime, nullable=True)
@@ -47,10 +55,15 @@ class PaymentEvent(Base):
     # Relaciones
     payment = relationship("Payment", back_populates="payment_events")
     
-    # Índices para prevenir duplicados y performance
+    # Índices para prevenir duplicados y performance. Cubren también las búsquedas
+    # por payment_id o event_type solos (prefijo), por eso no hay índices simples
     __table_args__ = (
         Index('idx_payment_event_type', 'payment_id', 'event_type'),
         Index('idx_event_created', 'event_type', 'created_at'),
+        # Un solo notification_sent por pago: destino del INSERT ... ON CONFLICT DO NOTHING
+        Index('ux_payment_event_notification_sent', 'payment_id', unique=True,
+              sqlite_where=event_type == 'notification_sent',
+              postgresql_where=event_type == 'notification_sent'),
     )
     
     def __repr__(self):
@@ -177,6 +190,7 @@ class AuditLog(Base):
     timestamp = Column(DateTime, nullable=False, default=func.now(), index=True)
     session_id = Column(String(100), nullable=True)
     correlation_id = Column(String(100), nullable=True)  # Para tracking de requests
+    timestamp_ns = Column(BigInteger, nullable=True)  # Epoch en nanosegundos: el valor que entra al hash del bloque
     
     # Blockchain Inmutable - Certificación Bancaria (según esquema real)
     previous_hash = Column(Text, nullable=True, index=True)  # SHA-256 del registro anterior
@@ -191,6 +205,8 @@ class AuditLog(Base):
     
     # Integridad y verificación (según esquema real)
     is_verified = Column(Boolean, default=True, nullable=True)  # Estado de verificación
+    verification_timestamp = Column(DateTime, nullable=True)  # Momento de la última verificación
+    data_checksum = Column(String(64), nullable=True)  # SHA-256 de request/response/error (entra al hash del bloque)
     blockchain_enabled = Column(Boolean, default=False, nullable=True)  # Si blockchain está activo
     
     # Relaciones
@@ -199,16 +215,54 @@ class AuditLog(Base):
     # Índices para queries de auditoría y blockchain
     __table_args__ = (
         Index('idx_audit_action_timestamp', 'action', 'timestamp'),
-        Index('idx_audit_payment_action', 'payment_id', 'action'),
+        Index('idx_audit_payment_action_ts', 'payment_id', 'action', 'timestamp'),  # Logs de un pago por acción, más recientes primero
         Index('idx_audit_performed_by', 'performed_by', 'timestamp'),
         Index('idx_audit_blockchain', 'block_number', 'current_hash'),
+        # Un solo bloque por número: dos escritores concurrentes con la misma cabeza no pueden bifurcar
+        # la cadena (los registros fuera del blockchain quedan con block_number 0)
+        Index('idx_audit_block_unique', 'block_number', unique=True,
+              sqlite_where=text('block_number > 0'), postgresql_where=text('block_number > 0')),
         Index('idx_audit_hash_chain', 'previous_hash', 'current_hash'),
         Index('idx_audit_correlation', 'correlation_id', 'timestamp'),
     )
     
+    def get_request_data(self) -> dict:
+        """
+        request_data decodificado; se parsea una vez y se cachea en la instancia
+        mientras request_data no cambie ({} si está vacío o no es JSON válido)
+        """
+        cached = self.__dict__.get('_request_data_cache')
+        if cached is not None and cached[0] is self.request_data:
+            return cached[1]
+        
+        try:
+            if not self.request_data:
+                data = {}
+            elif ORJSON_AVAILABLE:
+                data = orjson.loads(self.request_data)
+            else:
+                data = json.loads(self.request_data)
+        except (TypeError, ValueError):
+            data = {}
+        
+        self._request_data_cache = (self.request_data, data)
+        return data
+    
     def __repr__(self):
         return f"<AuditLog(id={self.id}, block={self.block_number}, action={self.action}, hash={self.current_hash[:8] if self.current_hash else 'None'}...)>"
 
+class BlockchainCheckpoint(Base):
+    """Último bloque verificado de la cadena de auditoría (fila única id=1) para verificación incremental"""
+    __tablename__ = 'blockchain_checkpoint'
+    
+    id = Column(Integer, primary_key=True)
+    block_number = Column(BigInteger, nullable=False)  # Último bloque verificado
+    chain_hash = Column(String(64), nullable=False)  # current_hash de ese bloque
+    verified_at = Column(DateTime, nullable=False, default=func.now())
+    
+    def __repr__(self):
+        return f"<BlockchainCheckpoint(block={self.block_number}, hash={self.chain_hash[:8]}...)>"
+
 class SecurityAlert(Base):
     """Alertas de seguridad para monitoreo enterprise"""
     __tablename__ = 'security_alerts'
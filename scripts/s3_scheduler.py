@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Scheduler en proceso para el archivado automático de logs en S3
+Alternativa a crontab: mantiene el intérprete, los imports y el pool de
+conexiones vivos entre ejecuciones en lugar de lanzar un proceso por disparo
+"""
+import sys
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Agregar el directorio raíz al path para imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv()
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from scripts.archive_logs_to_s3 import archive_older_than_days
+from scripts.setup_s3_cron import CRON_SCHEDULES, LOGS_DIR
+
+# Registro de la última ejecución exitosa, para recuperar disparos perdidos
+# mientras el proceso (o la máquina) estuvo detenido
+LAST_RUN_PATH = LOGS_DIR / "s3_scheduler_last_run.json"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger("s3_scheduler")
+
+class S3ArchiveJob:
+    """Job de archivado que reutiliza un único engine entre ejecuciones"""
+
+    def __init__(self, older_than_days: int = 90, compress: bool = True):
+        self.older_than_days = older_than_days
+        self.compress = compress
+        self.database_url = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
+        self.engine = create_engine(self.database_url, echo=False)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+    def run(self) -> bool:
+        """Ejecuta un archivado (síncrono; el executor lo corre fuera del event loop)"""
+        logger.info(f"Starting S3 archive job - older than {self.older_than_days} days")
+        db = self.SessionLocal()
+
+        try:
+            success = archive_older_than_days(db, self.older_than_days, self.compress)
+            if success:
+                save_last_run(datetime.now(timezone.utc))
+                logger.info("S3 archive job completed")
+            else:
+                logger.error("S3 archive job completed with errors")
+            return success
+
+        except Exception as e:
+            logger.error(f"Error in S3 archive job: {str(e)}")
+            return False
+
+        finally:
+            db.close()
+
+def load_last_run():
+    """Lee la fecha de la última ejecución exitosa (None si no hay registro)"""
+    try:
+        data = json.loads(LAST_RUN_PATH.read_text(encoding="utf-8"))
+        return datetime.fromisoformat(data["last_run"])
+    except FileNotFoundError:
+        return None
+    except (KeyError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable last-run file {LAST_RUN_PATH}: {str(e)}")
+        return None
+
+def save_last_run(when: datetime):
+    """Persiste la fecha de la última ejecución exitosa"""
+    LAST_RUN_PATH.parent.mkdir(exist_ok=True)
+    LAST_RUN_PATH.write_text(json.dumps({"last_run": when.isoformat()}), encoding="utf-8")
+
+def register_jobs(scheduler: AsyncIOScheduler, job: S3ArchiveJob, frequency: str = "weekly"):
+    """Registra el job de archivado con la misma programación que la entrada de crontab"""
+    trigger = CronTrigger.from_crontab(CRON_SCHEDULES[frequency])
+    job_options = {}
+    
+    # Si hubo un disparo programado después de la última ejecución y ya pasó, adelantar el
+    # próximo disparo del mismo job a ahora: max_instances=1 impide que el cron se solape
+    # con la recuperación (un job aparte no quedaría cubierto)
+    last_run = load_last_run()
+    if last_run is not None:
+        now = datetime.now(timezone.utc)
+        missed_fire = trigger.get_next_fire_time(None, last_run)
+        if missed_fire is not None and missed_fire <= now:
+            logger.warning(f"Missed S3 archive run at {missed_fire.isoformat()} - running now")
+            job_options["next_run_time"] = now
+    
+    scheduler.add_job(
+        job.run,
+        trigger,
+        id=f"s3_archive_{frequency}",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        **job_options
+    )
+
+def create_scheduler() -> AsyncIOScheduler:
+    """Crea el scheduler con AsyncIOExecutor (los jobs síncronos van al thread pool del loop)"""
+    return AsyncIOScheduler(executors={"default": AsyncIOExecutor()})
+
+def main():
+    """Función principal del script"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="In-process S3 archive scheduler for MercadoPago Enterprise",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "--frequency",
+        choices=list(CRON_SCHEDULES.keys()),
+        default="weekly",
+        help="Archive schedule"
+    )
+
+    parser.add_argument(
+        "--older-than",
+        type=int,
+        default=int(os.getenv("ARCHIVE_OLDER_THAN_DAYS", "90")),
+        metavar="DAYS",
+        help="Archive logs older than DAYS"
+    )
+
+    args = parser.parse_args()
+
+    if args.older_than <= 0:
+        print("ERROR: --older-than must be positive", file=sys.stderr)
+        return 2
+
+    job = S3ArchiveJob(older_than_days=args.older_than)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    scheduler = create_scheduler()
+    register_jobs(scheduler, job, args.frequency)
+    scheduler.start()
+
+    logger.info(f"S3 scheduler started - {args.frequency} ({CRON_SCHEDULES[args.frequency]})")
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        logger.info("S3 scheduler stopped by user")
+    finally:
+        scheduler.shutdown(wait=False)
+        loop.close()
+
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)
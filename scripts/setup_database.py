@@ -54,7 +54,10 @@ def setup_database():
             'nonce': 'INTEGER DEFAULT 0',
             'difficulty': 'INTEGER DEFAULT 1',
             'is_verified': 'BOOLEAN DEFAULT TRUE',
-            'blockchain_enabled': 'BOOLEAN DEFAULT FALSE'
+            'blockchain_enabled': 'BOOLEAN DEFAULT FALSE',
+            'timestamp_ns': 'BIGINT',
+            'data_checksum': 'VARCHAR(64)',
+            'verification_timestamp': 'DATETIME'
         }
         
         columns_added = 0
@@ -113,6 +116,19 @@ def setup_database():
         cursor.execute(create_config_table)
         print("   ✅ Tabla system_config verificada/creada")
         
+        # Checkpoint de verificación incremental del blockchain de auditoría
+        print("📋 Verificando tabla blockchain_checkpoint...")
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blockchain_checkpoint (
+            id INTEGER PRIMARY KEY,
+            block_number BIGINT NOT NULL,
+            chain_hash VARCHAR(64) NOT NULL,
+            verified_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        print("   ✅ Tabla blockchain_checkpoint verificada/creada")
+        
         # Insertar configuraciones por defecto
         default_configs = [
             ('blockchain_enabled', 'false', 'boolean'),
@@ -130,18 +146,41 @@ def setup_database():
         
         print("   ✅ Configuraciones por defecto insertadas")
         
+        # El índice único de block_number no se puede crear si la cadena ya tiene números repetidos
+        print("📋 Verificando números de bloque duplicados...")
+        
+        cursor.execute("""
+            SELECT block_number, COUNT(*) FROM audit_logs
+            WHERE block_number > 0
+            GROUP BY block_number
+            HAVING COUNT(*) > 1
+            ORDER BY block_number
+        """)
+        duplicate_blocks = cursor.fetchall()
+        
+        if duplicate_blocks:
+            print(f"   ❌ {len(duplicate_blocks)} números de bloque repetidos en audit_logs:")
+            for block_number, count in duplicate_blocks[:10]:
+                print(f"      • Bloque {block_number}: {count} filas")
+            print("   ⚠️  No se crea idx_audit_block_unique: revisar y renumerar esos bloques y volver a ejecutar")
+        else:
+            print("   ✅ Sin números de bloque duplicados")
+        
         # Crear índices para performance si no existen
         print("📋 Creando índices de performance...")
         
         indices = [
             "CREATE INDEX IF NOT EXISTS idx_audit_hash ON audit_logs(current_hash)",
             "CREATE INDEX IF NOT EXISTS idx_audit_block ON audit_logs(block_number)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_audit_block_unique ON audit_logs(block_number) WHERE block_number > 0",
             "CREATE INDEX IF NOT EXISTS idx_audit_verified ON audit_logs(is_verified)",
             "CREATE INDEX IF NOT EXISTS idx_security_threat_score ON security_alerts(threat_score)",
             "CREATE INDEX IF NOT EXISTS idx_config_key ON system_config(config_key)"
         ]
         
         for index_sql in indices:
+            if duplicate_blocks and "idx_audit_block_unique" in index_sql:
+                continue
             try:
                 cursor.execute(index_sql)
                 print(f"   ✅ Índice creado: {index_sql.split('idx_')[1].split(' ')[0]}")
@@ -151,6 +190,10 @@ def setup_database():
         # Commit todos los cambios
         conn.commit()
         
+        if duplicate_blocks:
+            print(f"\n❌ Base de datos configurada sin el índice único de bloques (hay duplicados)")
+            return False
+        
         print(f"\n🎉 Base de datos configurada exitosamente!")
         print(f"   📊 Columnas agregadas: {columns_added}")
         print(f"   🔧 Esquema actualizado para seguridad blockchain")
@@ -14,6 +14,10 @@ sys.path.append(str(Path(__file__).parent.parent))
 from dotenv import load_dotenv
 load_dotenv()
 
+# Versión de esquema registrada en PRAGMA user_version al completar la migración.
+# Incrementar cada vez que este script agregue nuevos pasos.
+MULTITENANT_SCHEMA_VERSION = 2
+
 def setup_multitenant_database():
     """
     Migra la base de datos a arquitectura multi-tenant
@@ -36,6 +40,12 @@ def setup_multitenant_database():
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
+        # 0. Saltar la migración si la base ya está en la versión objetivo
+        (schema_version,) = cursor.execute("PRAGMA user_version").fetchone()
+        if schema_version >= MULTITENANT_SCHEMA_VERSION:
+            print(f"   ✅ Base de datos ya migrada (user_version={schema_version})")
+            return True
+        
         # 1. Crear tabla client_accounts
         print("📋 Creando tabla client_accounts...")
         
@@ -77,6 +87,9 @@ def setup_multitenant_database():
         cursor.execute(create_client_accounts_table)
         print("   ✅ Tabla client_accounts creada")
         
+        # Pasos que fallaron sin abortar la migración: con alguno, no se marca user_version
+        failed_steps = 0
+        
         # 2. Verificar si la columna client_account_id existe en payments
         print("📋 Verificando tabla payments...")
         
@@ -88,6 +101,7 @@ def setup_multitenant_database():
                 cursor.execute("ALTER TABLE payments ADD COLUMN client_account_id INTEGER")
                 print("   ✅ Agregada columna client_account_id a payments")
             except sqlite3.Error as e:
+                failed_steps += 1
                 print(f"   ⚠️  Error agregando client_account_id: {e}")
         else:
             print("   ✅ Columna client_account_id ya existe en payments")
@@ -104,13 +118,15 @@ def setup_multitenant_database():
             "CREATE INDEX IF NOT EXISTS idx_payment_client_created ON payments(client_account_id, created_at)"
         ]
         
+        # Cada índice por separado: si uno falla (p. ej. falta una columna) los demás se crean igual
         for index_sql in indices:
+            index_name = index_sql.split('idx_')[1].split(' ')[0]
             try:
                 cursor.execute(index_sql)
-                index_name = index_sql.split('idx_')[1].split(' ')[0]
                 print(f"   ✅ Índice creado: {index_name}")
             except sqlite3.Error as e:
-                print(f"   ⚠️  Error creando índice: {e}")
+                failed_steps += 1
+                print(f"   ⚠️  Error creando índice {index_name}: {e}")
         
         # 4. Insertar cliente por defecto para datos existentes
         print("📋 Configurando cliente por defecto...")
@@ -180,6 +196,15 @@ def setup_multitenant_database():
         
         print("   ✅ Configuraciones multi-tenant agregadas")
         
+        if failed_steps:
+            # Sin user_version la próxima ejecución reintenta la migración completa (pasos idempotentes)
+            conn.commit()
+            print(f"\n❌ Migración multi-tenant incompleta: {failed_steps} pasos fallaron, se reintentará en la próxima ejecución")
+            return False
+        
+        # PRAGMA no admite parámetros; el valor es una constante entera del módulo
+        cursor.execute(f"PRAGMA user_version = {int(MULTITENANT_SCHEMA_VERSION)}")
+        
         # Commit todos los cambios
         conn.commit()
         
@@ -221,8 +246,7 @@ def verify_multitenant_schema():
         
         # Verificar tabla client_accounts
         try:
-            cursor.execute("PRAGMA table_info(client_accounts)")
-            columns = cursor.fetchall()
+            columns = cursor.execute("PRAGMA table_info(client_accounts)").fetchall()
             
             if columns:
                 print(f"\n📊 Tabla: client_accounts")
@@ -242,7 +266,7 @@ def verify_multitenant_schema():
         # Verificar relación en payments
         try:
             cursor.execute("PRAGMA table_info(payments)")
-            payment_columns = [row[1] for row in cursor.fetchall()]
+            payment_columns = {row[1] for row in cursor}
             
             if 'client_account_id' in payment_columns:
                 print(f"\n✅ Columna client_account_id existe en payments")
@@ -255,9 +279,8 @@ def verify_multitenant_schema():
                     GROUP BY ca.id, ca.client_name
                 """)
                 
-                client_stats = cursor.fetchall()
                 print("   📊 Estadísticas por cliente:")
-                for client_name, count in client_stats:
+                for client_name, count in cursor:
                     print(f"      {client_name}: {count} pagos")
             else:
                 print(f"\n❌ Columna client_account_id no existe en payments")
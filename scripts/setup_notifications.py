@@ -73,12 +73,13 @@ def test_notification_service():
     with SessionLocal() as db:
         # Crear servicio de notificaciones
         notification_service = NotificationService(db)
+        channels = tuple(c.value for c in notification_service.config.enabled_channels if c)
         
         print(f"📋 Configuración cargada:")
         print(f"   Slack: {'✅' if notification_service.config.slack_webhook_url else '❌'}")
         print(f"   Email: {'✅' if notification_service.config.smtp_server else '❌'}")
         print(f"   Webhooks: {'✅' if notification_service.config.webhook_urls else '❌'}")
-        print(f"   Canales habilitados: {[c.value for c in notification_service.config.enabled_channels if c]}")
+        print(f"   Canales habilitados: {list(channels)}")
         
         # Probar notificación de prueba
         print(f"\n📤 Enviando notificación de prueba...")
@@ -211,6 +212,8 @@ def main():
     
     with SessionLocal() as db:
         service = NotificationService(db)
+        # La configuración no cambia durante la sesión: calcular canales una sola vez
+        channels = tuple(c.value for c in service.config.enabled_channels if c)
         
         while True:
             print("\\nOpciones:")
@@ -253,7 +256,7 @@ def main():
                 print(f"   Slack: {'✅' if config.slack_webhook_url else '❌'}")
                 print(f"   Email: {'✅' if config.smtp_server else '❌'}")
                 print(f"   Webhooks: {'✅' if config.webhook_urls else '❌'}")
-                print(f"   Canales: {[c.value for c in config.enabled_channels if c]}")
+                print(f"   Canales: {list(channels)}")
                 
             elif choice == "0":
                 break
@@ -3,31 +3,38 @@
 Script para configurar cron jobs automáticos de archivado S3
 Configura tareas programadas para backup automático de logs
 """
-import os
 import sys
 from pathlib import Path
 from datetime import datetime
 
-def get_project_path():
-    """Obtiene la ruta absoluta del proyecto"""
-    return str(Path(__file__).parent.parent.absolute())
+# Programaciones soportadas (formato crontab), compartidas con scripts/s3_scheduler.py
+CRON_SCHEDULES = {
+    "weekly": "0 2 * * 0",
+    "monthly": "0 3 1 * *",
+    "daily": "0 1 * * *"
+}
+
+# Rutas del proyecto (resueltas una sola vez al importar)
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = PROJECT_ROOT / "scripts"
+LOGS_DIR = PROJECT_ROOT / "logs"
+ARCHIVE_SCRIPT_PATH = SCRIPTS_DIR / "archive_logs_to_s3.py"
+CRON_SCRIPT_PATH = SCRIPTS_DIR / "s3_archive_cron.sh"
+SYSTEMD_UNIT_PATH = SCRIPTS_DIR / "s3_scheduler.service"
+ARCHIVE_LOG_PATH = LOGS_DIR / "s3_archive.log"
 
 def create_cron_script():
     """Crea script wrapper para cron"""
-    project_path = get_project_path()
-    
     cron_script_content = f"""#!/bin/bash
 # Script wrapper para archivado automático S3
 # Generado automáticamente el {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 # Configurar entorno
-cd {project_path}
+cd {PROJECT_ROOT}
 export PATH="/usr/local/bin:/usr/bin:/bin:$PATH"
 
-# Cargar variables de entorno si existe .env
-if [ -f .env ]; then
-    export $(cat .env | grep -v '^#' | xargs)
-fi
+# Cargar variables de entorno si existe .env (builtins del shell, sin procesos extra)
+[ -f .env ] && {{ set -a; . ./.env; set +a; }}
 
 # Ejecutar archivado
 python3 scripts/archive_logs_to_s3.py --older-than 90 >> logs/s3_archive.log 2>&1
@@ -36,68 +43,95 @@ python3 scripts/archive_logs_to_s3.py --older-than 90 >> logs/s3_archive.log 2>&
 echo "$(date): S3 archive cron job completed" >> logs/s3_archive.log
 """
     
-    script_path = os.path.join(project_path, "scripts", "s3_archive_cron.sh")
-    
-    with open(script_path, 'w') as f:
-        f.write(cron_script_content)
+    CRON_SCRIPT_PATH.write_text(cron_script_content, encoding="utf-8")
     
     # Hacer ejecutable
-    os.chmod(script_path, 0o755)
+    CRON_SCRIPT_PATH.chmod(0o755)
     
-    return script_path
+    return CRON_SCRIPT_PATH
 
 def generate_crontab_entries(script_path):
     """Genera entradas de crontab sugeridas"""
     
     entries = {
-        "weekly": f"0 2 * * 0 {script_path}  # Archivado semanal (domingos 2 AM)",
-        "monthly": f"0 3 1 * * {script_path}  # Archivado mensual (día 1, 3 AM)", 
-        "daily": f"0 1 * * * {script_path}  # Archivado diario (1 AM)"
+        "weekly": f"{CRON_SCHEDULES['weekly']} {script_path}  # Archivado semanal (domingos 2 AM)",
+        "monthly": f"{CRON_SCHEDULES['monthly']} {script_path}  # Archivado mensual (día 1, 3 AM)", 
+        "daily": f"{CRON_SCHEDULES['daily']} {script_path}  # Archivado diario (1 AM)"
     }
     
     return entries
 
+def create_systemd_unit(frequency="weekly"):
+    """Crea unidad systemd para el scheduler en proceso (alternativa a crontab)"""
+    unit_content = f"""[Unit]
+Description=MercadoPago Enterprise - Archivado automatico S3 ({frequency})
+After=network-online.target
+
+[Service]
+Type=simple
+WorkingDirectory={PROJECT_ROOT}
+ExecStart={sys.executable} -m scripts.s3_scheduler --frequency {frequency}
+Restart=always
+RestartSec=30
+
+[Install]
+WantedBy=multi-user.target
+"""
+    
+    SYSTEMD_UNIT_PATH.write_text(unit_content, encoding="utf-8")
+    
+    return SYSTEMD_UNIT_PATH
+
 def show_installation_instructions(script_path, cron_entries):
     """Muestra instrucciones de instalación"""
     
-    print("🔧 CONFIGURACIÓN DE ARCHIVADO AUTOMÁTICO S3")
-    print("=" * 60)
-    print()
-    print("📁 Script creado en:")
-    print(f"   {script_path}")
-    print()
-    print("📅 OPCIONES DE PROGRAMACIÓN:")
-    print()
+    # Se arma el texto completo y se emite con una sola escritura a stdout
+    lines = [
+        "🔧 CONFIGURACIÓN DE ARCHIVADO AUTOMÁTICO S3",
+        "=" * 60,
+        "",
+        "📁 Script creado en:",
+        f"   {script_path}",
+        "",
+        "📅 OPCIONES DE PROGRAMACIÓN:",
+        "",
+    ]
     
     for frequency, entry in cron_entries.items():
-        print(f"🕐 {frequency.upper()}:")
-        print(f"   {entry}")
-        print()
+        lines.extend([
+            f"🕐 {frequency.upper()}:",
+            f"   {entry}",
+            "",
+        ])
     
-    print("⚙️  INSTALACIÓN MANUAL:")
-    print()
-    print("1. Editar crontab:")
-    print("   crontab -e")
-    print()
-    print("2. Agregar una de las líneas de arriba (recomendado: semanal)")
-    print()
-    print("3. Verificar crontab:")
-    print("   crontab -l")
-    print()
-    print("📋 INSTALACIÓN AUTOMÁTICA (SEMANAL):")
-    print()
-    print("   # Instalar cron job semanal automáticamente")
-    print(f"   (crontab -l 2>/dev/null; echo '{cron_entries['weekly']}') | crontab -")
-    print()
-    print("🗂️  LOGS:")
-    print(f"   Los logs se guardarán en: {os.path.join(os.path.dirname(script_path), '..', 'logs', 's3_archive.log')}")
-    print()
-    print("🔍 VERIFICAR FUNCIONAMIENTO:")
-    print(f"   # Ejecutar manualmente para probar")
-    print(f"   {script_path}")
-    print()
-    print("   # Ver logs")
-    print(f"   tail -f {os.path.join(os.path.dirname(script_path), '..', 'logs', 's3_archive.log')}")
+    lines.extend([
+        "⚙️  INSTALACIÓN MANUAL:",
+        "",
+        "1. Editar crontab:",
+        "   crontab -e",
+        "",
+        "2. Agregar una de las líneas de arriba (recomendado: semanal)",
+        "",
+        "3. Verificar crontab:",
+        "   crontab -l",
+        "",
+        "📋 INSTALACIÓN AUTOMÁTICA (SEMANAL):",
+        "",
+        "   # Instalar cron job semanal automáticamente",
+        f"   (crontab -l 2>/dev/null; echo '{cron_entries['weekly']}') | crontab -",
+        "",
+        "🗂️  LOGS:",
+        f"   Los logs se guardarán en: {ARCHIVE_LOG_PATH}",
+        "",
+        "🔍 VERIFICAR FUNCIONAMIENTO:",
+        "   # Ejecutar manualmente para probar",
+        f"   {script_path}",
+        "",
+        "   # Ver logs",
+        f"   tail -f {ARCHIVE_LOG_PATH}",
+    ])
+    
+    sys.stdout.write("\n".join(lines) + "\n")
 
 def install_cron_job_automatically(script_path, frequency="weekly"):
     """Instala cron job automáticamente"""
@@ -110,34 +144,28 @@ def install_cron_job_automatically(script_path, frequency="weekly"):
         return False
     
     try:
+        import shlex
         import subprocess
         
-        # Obtener crontab actual
-        try:
-            current_crontab = subprocess.check_output(['crontab', '-l'], stderr=subprocess.DEVNULL).decode('utf-8')
-        except subprocess.CalledProcessError:
-            current_crontab = ""
+        # Nueva entrada (sin comentario)
+        new_entry = cron_entries[frequency].split('#')[0].strip()
         
-        # Verificar si ya existe
-        if script_path in current_crontab:
-            print("⚠️  Ya existe un cron job para este script")
+        # Leer, filtrar entradas previas de este script y reinstalar en un solo pipeline.
+        # Se compara el campo de comando completo ($6) para no descartar rutas que
+        # solo contienen script_path como subcadena (p.ej. s3_archive_cron.sh.bak)
+        cmd = (
+            f"(crontab -l 2>/dev/null | awk -v p={shlex.quote(str(script_path))} '$6 != p'; "
+            f"echo {shlex.quote(new_entry)}) | crontab -"
+        )
+        # text=True decodifica el pipe directamente a str; el error se informa con el stderr de crontab
+        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            print(f"❌ Error instalando cron job: {result.stderr.strip() or f'crontab salió con código {result.returncode}'}")
             return False
         
-        # Agregar nueva entrada
-        new_entry = cron_entries[frequency].split('#')[0].strip()  # Remover comentario
-        new_crontab = current_crontab.rstrip() + "\n" + new_entry + "\n"
-        
-        # Instalar nueva crontab
-        process = subprocess.Popen(['crontab', '-'], stdin=subprocess.PIPE)
-        process.communicate(input=new_crontab.encode('utf-8'))
-        
-        if process.returncode == 0:
-            print(f"✅ Cron job {frequency} instalado exitosamente")
-            print(f"   Comando: {new_entry}")
-            return True
-        else:
-            print("❌ Error instalando cron job")
-            return False
+        print(f"✅ Cron job {frequency} instalado exitosamente")
+        print(f"   Comando: {new_entry}")
+        return True
             
     except Exception as e:
         print(f"❌ Error instalando cron job: {str(e)}")
@@ -162,6 +190,9 @@ Ejemplos:
   # Crear script e instalar cron job mensual
   python setup_s3_cron.py --install monthly
 
+  # Generar unidad systemd para el scheduler en proceso (sin crontab)
+  python setup_s3_cron.py --systemd weekly
+
 Frecuencias disponibles:
   - weekly: Domingos a las 2 AM
   - monthly: Día 1 de cada mes a las 3 AM  
@@ -175,6 +206,12 @@ Frecuencias disponibles:
         help="Instalar cron job automáticamente con la frecuencia especificada"
     )
     
+    parser.add_argument(
+        "--systemd",
+        choices=["weekly", "monthly", "daily"],
+        help="Generar unidad systemd para el scheduler en proceso en lugar de crontab"
+    )
+    
     args = parser.parse_args()
     
     print("🗄️  Setup de Archivado Automático S3 - MercadoPago Enterprise")
@@ -182,15 +219,28 @@ Frecuencias disponibles:
     print()
     
     # Verificar que estamos en el directorio correcto
-    project_path = get_project_path()
-    if not os.path.exists(os.path.join(project_path, "scripts", "archive_logs_to_s3.py")):
+    if not ARCHIVE_SCRIPT_PATH.exists():
         print("❌ Error: No se encuentra archive_logs_to_s3.py")
         print(f"   Asegúrate de ejecutar este script desde el directorio del proyecto")
         return 1
     
     # Crear directorio de logs si no existe
-    logs_dir = os.path.join(project_path, "logs")
-    os.makedirs(logs_dir, exist_ok=True)
+    LOGS_DIR.mkdir(exist_ok=True)
+    
+    if args.systemd:
+        # Scheduler en proceso: sin wrapper bash ni crontab
+        print(f"📝 Creando unidad systemd para scheduler en proceso ({args.systemd})...")
+        unit_path = create_systemd_unit(args.systemd)
+        print(f"   ✅ Unidad creada: {unit_path}")
+        print()
+        print("📋 INSTALACIÓN:")
+        print(f"   sudo cp {unit_path} /etc/systemd/system/")
+        print("   sudo systemctl daemon-reload")
+        print("   sudo systemctl enable --now s3_scheduler.service")
+        print()
+        print("🔍 VERIFICAR FUNCIONAMIENTO:")
+        print("   journalctl -u s3_scheduler.service -f")
+        return 0
     
     # Crear script de cron
     print("📝 Creando script wrapper para cron...")
@@ -220,7 +270,7 @@ Frecuencias disponibles:
             print(f"   {script_path}")
             print()
             print("3. Monitorear logs:")
-            print(f"   tail -f {os.path.join(logs_dir, 's3_archive.log')}")
+            print(f"   tail -f {ARCHIVE_LOG_PATH}")
         else:
             print()
             print("⚠️  Instalación automática falló. Usa instalación manual:")
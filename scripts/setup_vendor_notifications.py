@@ -5,128 +5,180 @@ Crea la tabla PaymentEvent y configura el sistema de notificaciones
 """
 import os
 import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
-# Agregar el directorio raíz al path
-sys.path.append(str(Path(__file__).parent.parent))
+# Agregar el directorio raíz al path (al inicio, para resolver primero los módulos locales)
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
 
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+# Reporte vía logging: con LOG_LEVEL=WARNING (CI) los mensajes informativos no se formatean ni se escriben
+log = logging.getLogger("vendor_setup")
 
-# Cargar variables de entorno
-load_dotenv()
+# DDL de payment_events, construido una vez al importar el módulo
+PAYMENT_EVENTS_TABLE_DDL = """
+    CREATE TABLE payment_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        payment_id INTEGER NOT NULL,
+        event_type VARCHAR(50) NOT NULL,
+        event_data TEXT,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        processed_at DATETIME,
+        FOREIGN KEY (payment_id) REFERENCES payments(id)
+    )
+"""
+
+PAYMENT_EVENTS_INDEX_DDL = (
+    # Deduplicación por pago: WHERE payment_id = ? AND event_type = ?
+    "CREATE INDEX IF NOT EXISTS idx_payment_event_type ON payment_events(payment_id, event_type)",
+    # Listados y estadísticas: WHERE event_type = ? [AND created_at >= ?] ORDER BY created_at
+    "CREATE INDEX IF NOT EXISTS idx_event_created ON payment_events(event_type, created_at)",
+    # Un solo notification_sent por pago (INSERT ... ON CONFLICT DO NOTHING)
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_payment_event_notification_sent ON payment_events(payment_id) WHERE event_type = 'notification_sent'",
+)
+
+# Pagos con más de un notification_sent: impiden crear el índice único de deduplicación
+DUPLICATE_NOTIFICATIONS_SQL = """
+    SELECT payment_id, COUNT(*) FROM payment_events
+    WHERE event_type = 'notification_sent'
+    GROUP BY payment_id
+    HAVING COUNT(*) > 1
+    ORDER BY payment_id
+"""
+
+def run_ddl_atomically(engine, statements) -> None:
+    """
+    Ejecuta las sentencias DDL en una sola transacción: si una falla, no queda ninguna aplicada
+    """
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # pysqlite no abre transacción para DDL (cada sentencia se confirma sola): el BEGIN
+            # explícito la abre; si una sentencia falla, el rollback de begin() la revierte
+            script = ";\n".join(statements)
+            conn.connection.driver_connection.executescript(f"BEGIN;\n{script};\nCOMMIT;")
+        else:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+
+# Verificaciones SMTP: (variables, requerida, mensaje si está configurada, mensaje si falta).
+# "{}" en el mensaje se reemplaza por el valor de la primera variable
+SMTP_CHECKS = (
+    (("SMTP_SERVER",), True, "SMTP_SERVER configurado", "SMTP_SERVER no configurado"),
+    (("SMTP_USERNAME", "SMTP_PASSWORD"), False, "Credenciales SMTP configuradas", "Credenciales SMTP no configuradas (opcional)"),
+    (("FROM_EMAIL",), True, "FROM_EMAIL: {}", "FROM_EMAIL no configurado"),
+    (("TO_EMAILS",), False, "TO_EMAILS: {}", "TO_EMAILS no configurado (se usará email del cliente)"),
+)
+
+@lru_cache(maxsize=1)
+def get_engine():
+    """Engine compartido por todas las fases del setup (un solo pool de conexiones)"""
+    # Import diferido: el resto del script no necesita SQLAlchemy
+    from sqlalchemy import create_engine
+    
+    database_url = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
+    return create_engine(database_url, echo=False, pool_pre_ping=True)
 
 def setup_payment_events_table():
     """
     Crea la tabla PaymentEvent para tracking de notificaciones
     """
-    print("🔧 CONFIGURACIÓN DE NOTIFICACIONES VENDEDOR")
-    print("=" * 60)
+    log.info("🔧 CONFIGURACIÓN DE NOTIFICACIONES VENDEDOR")
+    log.info("=" * 60)
     
     try:
+        from sqlalchemy import inspect
+        
         # Conectar a la base de datos
-        database_url = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
-        engine = create_engine(database_url, echo=False)
+        engine = get_engine()
         
-        print(f"📊 Conectando a: {database_url}")
+        if log.isEnabledFor(logging.INFO):
+            log.info("📊 Conectando a: %s", engine.url.render_as_string(hide_password=True))
         
-        with engine.connect() as conn:
-            # Verificar si la tabla ya existe
-            try:
-                result = conn.execute(text("SELECT COUNT(*) FROM payment_events LIMIT 1"))
-                print("✅ La tabla payment_events ya existe")
-                return True
-            except Exception:
-                print("🔧 La tabla payment_events no existe, creándola...")
+        # Verificar si la tabla ya existe (consulta al catálogo, sin SELECT fallido)
+        if inspect(engine).has_table("payment_events"):
+            log.info("✅ La tabla payment_events ya existe")
+            
+            # El índice único de deduplicación no se puede crear si ya hay notification_sent repetidos
+            with engine.connect() as conn:
+                duplicated_payments = conn.exec_driver_sql(DUPLICATE_NOTIFICATIONS_SQL).fetchall()
             
-            # Crear la tabla PaymentEvent
+            if duplicated_payments:
+                log.error(
+                    "❌ %d pagos con más de un evento notification_sent (p. ej. %s): eliminar los duplicados "
+                    "antes de crear ux_payment_event_notification_sent",
+                    len(duplicated_payments), ", ".join(str(row[0]) for row in duplicated_payments[:10])
+                )
+                index_ddl = tuple(ddl for ddl in PAYMENT_EVENTS_INDEX_DDL if "UNIQUE" not in ddl)
+            else:
+                index_ddl = PAYMENT_EVENTS_INDEX_DDL
+            
+            # Asegurar los índices (IF NOT EXISTS) por si una ejecución anterior los dejó sin crear
             try:
-                conn.execute(text("""
-                    CREATE TABLE payment_events (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        payment_id INTEGER NOT NULL,
-                        event_type VARCHAR(50) NOT NULL,
-                        event_data TEXT,
-                        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                        processed_at DATETIME,
-                        FOREIGN KEY (payment_id) REFERENCES payments(id)
-                    )
-                """))
-                
-                # Crear índices
-                conn.execute(text("""
-                    CREATE INDEX idx_payment_event_type ON payment_events(payment_id, event_type)
-                """))
-                
-                conn.execute(text("""
-                    CREATE INDEX idx_event_created ON payment_events(event_type, created_at)
-                """))
-                
-                conn.commit()
-                print("✅ Tabla payment_events creada exitosamente")
-                print("✅ Índices creados para performance")
-                
-                return True
-                
+                run_ddl_atomically(engine, index_ddl)
             except Exception as e:
-                print(f"❌ Error creando tabla: {str(e)}")
+                log.error("❌ No se pudieron crear los índices de payment_events: %s", e)
+                return False
+            
+            if duplicated_payments:
+                # Sin el índice único el servicio cae al control anti-duplicados por SELECT (no atómico)
                 return False
+            
+            log.info("✅ Índices de payment_events verificados")
+            return True
+        
+        log.info("🔧 La tabla payment_events no existe, creándola...")
+        
+        # Crear la tabla PaymentEvent con sus índices: todo o nada
+        try:
+            run_ddl_atomically(engine, (PAYMENT_EVENTS_TABLE_DDL,) + PAYMENT_EVENTS_INDEX_DDL)
+            
+            log.info("✅ Tabla payment_events creada exitosamente")
+            log.info("✅ Índices creados para performance")
+            
+            return True
+            
+        except Exception as e:
+            log.error("❌ Error creando tabla: %s", e)
+            return False
                 
     except Exception as e:
-        print(f"❌ Error conectando a la base de datos: {str(e)}")
+        log.error("❌ Error conectando a la base de datos: %s", e)
         return False
 
 def verify_smtp_configuration():
     """
     Verifica la configuración SMTP para envío de emails
     """
-    print(f"\n📧 VERIFICANDO CONFIGURACIÓN SMTP...")
-    
-    smtp_server = os.getenv("SMTP_SERVER")
-    smtp_port = os.getenv("SMTP_PORT", "587")
-    smtp_username = os.getenv("SMTP_USERNAME")
-    smtp_password = os.getenv("SMTP_PASSWORD")
-    from_email = os.getenv("FROM_EMAIL")
-    to_emails = os.getenv("TO_EMAILS")
-    
-    config_status = []
-    
-    if smtp_server:
-        config_status.append("✅ SMTP_SERVER configurado")
-    else:
-        config_status.append("❌ SMTP_SERVER no configurado")
-    
-    if smtp_username and smtp_password:
-        config_status.append("✅ Credenciales SMTP configuradas")
-    else:
-        config_status.append("⚠️ Credenciales SMTP no configuradas (opcional)")
-    
-    if from_email:
-        config_status.append(f"✅ FROM_EMAIL: {from_email}")
-    else:
-        config_status.append("❌ FROM_EMAIL no configurado")
+    log.info("\n📧 VERIFICANDO CONFIGURACIÓN SMTP...")
     
-    if to_emails:
-        config_status.append(f"✅ TO_EMAILS: {to_emails}")
-    else:
-        config_status.append("⚠️ TO_EMAILS no configurado (se usará email del cliente)")
+    # Una sola referencia local al entorno para todas las lecturas
+    env = os.environ
+    results = [
+        (names, required, ok_msg, missing_msg, all(env.get(name) for name in names))
+        for names, required, ok_msg, missing_msg in SMTP_CHECKS
+    ]
     
-    for status in config_status:
-        print(f"   {status}")
+    for names, required, ok_msg, missing_msg, present in results:
+        if present:
+            log.info("   ✅ %s", ok_msg.format(env.get(names[0])))
+        else:
+            log.info("   %s %s", "❌" if required else "⚠️", missing_msg)
     
-    # Determinar si está listo para envío
-    smtp_ready = bool(smtp_server and from_email)
+    # Determinar si está listo para envío (todas las variables requeridas presentes)
+    smtp_ready = all(present for _, required, _, _, present in results if required)
     
     if smtp_ready:
-        print("✅ Configuración SMTP lista para envío de emails")
+        log.info("✅ Configuración SMTP lista para envío de emails")
     else:
-        print("⚠️ Configuración SMTP incompleta - emails no se enviarán")
-        print("   Para habilitar emails, configura en .env:")
-        print("   SMTP_SERVER=smtp.gmail.com")
-        print("   SMTP_PORT=587")
-        print("   FROM_EMAIL=tu-email@gmail.com")
-        print("   SMTP_USERNAME=tu-email@gmail.com")
-        print("   SMTP_PASSWORD=tu-app-password")
+        log.warning("⚠️ Configuración SMTP incompleta - emails no se enviarán")
+        log.warning("   Para habilitar emails, configura en .env:")
+        log.warning("   SMTP_SERVER=smtp.gmail.com")
+        log.warning("   SMTP_PORT=587")
+        log.warning("   FROM_EMAIL=tu-email@gmail.com")
+        log.warning("   SMTP_USERNAME=tu-email@gmail.com")
+        log.warning("   SMTP_PASSWORD=tu-app-password")
     
     return smtp_ready
 
@@ -134,48 +186,49 @@ def test_notification_system():
     """
     Prueba básica del sistema de notificaciones
     """
-    print(f"\n🧪 PROBANDO SISTEMA DE NOTIFICACIONES...")
+    log.info("\n🧪 PROBANDO SISTEMA DE NOTIFICACIONES...")
     
     try:
         # Importar aquí para evitar problemas de circular imports
-        sys.path.append(str(Path(__file__).parent.parent))
-        
-        from sqlalchemy import create_engine
         from sqlalchemy.orm import sessionmaker
         from services.vendor_notification_service import VendorNotificationService
         
-        # Conectar a BD
-        database_url = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
-        engine = create_engine(database_url, echo=False)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        db = SessionLocal()
+        # Conectar a BD (reutiliza el engine del paso de creación de tabla)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
         
-        # Inicializar servicio
-        vendor_service = VendorNotificationService(db)
+        def run_query(method_name, **kwargs):
+            # Una sesión por consulta: Session no es segura entre hilos
+            db = SessionLocal()
+            try:
+                vendor_service = VendorNotificationService(db)
+                return getattr(vendor_service, method_name)(**kwargs)
+            finally:
+                db.close()
         
-        # Obtener estadísticas
-        stats = vendor_service.get_notification_stats()
-        print(f"✅ Servicio inicializado correctamente")
-        print(f"   📊 Notificaciones aprobadas: {stats['total_approved_notifications']}")
-        print(f"   📧 Notificaciones enviadas: {stats['total_sent_notifications']}")
-        print(f"   📈 Tasa de éxito: {stats['success_rate']:.1f}%")
+        # Estadísticas y notificaciones recientes son independientes: se consultan en paralelo
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            stats_future = executor.submit(run_query, "get_notification_stats")
+            recent_future = executor.submit(run_query, "get_recent_notifications", limit=5)
+            stats = stats_future.result()
+            notifications = recent_future.result()
         
-        # Obtener notificaciones recientes
-        notifications = vendor_service.get_recent_notifications(limit=5)
-        print(f"✅ Últimas notificaciones: {len(notifications)} encontradas")
+        log.info("✅ Servicio inicializado correctamente")
+        log.info("   📊 Notificaciones aprobadas: %s", stats['total_approved_notifications'])
+        log.info("   📧 Notificaciones enviadas: %s", stats['total_sent_notifications'])
+        log.info("   📈 Tasa de éxito: %.1f%%", stats['success_rate'])
+        log.info("✅ Últimas notificaciones: %d encontradas", len(notifications))
         
-        db.close()
         return True
         
     except Exception as e:
-        print(f"❌ Error probando sistema: {str(e)}")
+        log.error("❌ Error probando sistema: %s", e)
         return False
 
 def main():
     """Función principal"""
-    print("🚀 SETUP MVP NOTIFICACIONES VENDEDOR")
-    print("Configuración del sistema de notificaciones para pagos aprobados")
-    print("=" * 70)
+    log.info("🚀 SETUP MVP NOTIFICACIONES VENDEDOR")
+    log.info("Configuración del sistema de notificaciones para pagos aprobados")
+    log.info("=" * 70)
     
     # 1. Crear tabla PaymentEvent
     table_success = setup_payment_events_table()
@@ -183,35 +236,46 @@ def main():
     # 2. Verificar configuración SMTP
     smtp_ready = verify_smtp_configuration()
     
-    # 3. Probar sistema
-    system_ready = test_notification_system()
+    # 3. Probar sistema (consulta payment_events: depende del paso 1)
+    if table_success:
+        system_ready = test_notification_system()
+    else:
+        log.warning("\n⏭️ Prueba del sistema omitida: la tabla payment_events no está disponible")
+        system_ready = False
     
-    print(f"\n📋 RESUMEN DE CONFIGURACIÓN:")
-    print(f"   {'✅' if table_success else '❌'} Tabla PaymentEvent: {'Creada' if table_success else 'Error'}")
-    print(f"   {'✅' if smtp_ready else '⚠️'} Configuración SMTP: {'Lista' if smtp_ready else 'Incompleta'}")
-    print(f"   {'✅' if system_ready else '❌'} Sistema de notificaciones: {'Funcionando' if system_ready else 'Error'}")
+    log.info("\n📋 RESUMEN DE CONFIGURACIÓN:")
+    log.info("   %s Tabla PaymentEvent: %s", '✅' if table_success else '❌', 'Creada' if table_success else 'Error')
+    log.info("   %s Configuración SMTP: %s", '✅' if smtp_ready else '⚠️', 'Lista' if smtp_ready else 'Incompleta')
+    log.info("   %s Sistema de notificaciones: %s", '✅' if system_ready else '❌', 'Funcionando' if system_ready else 'Error')
     
     if table_success and system_ready:
-        print(f"\n🎉 ¡CONFIGURACIÓN COMPLETADA EXITOSAMENTE!")
-        print("✅ El sistema de notificaciones vendedor está listo")
-        print("✅ Tabla PaymentEvent creada con protección anti-duplicados")
-        print("✅ Endpoints /api/notifications/ disponibles")
+        log.info("\n🎉 ¡CONFIGURACIÓN COMPLETADA EXITOSAMENTE!")
+        log.info("✅ El sistema de notificaciones vendedor está listo")
+        log.info("✅ Tabla PaymentEvent creada con protección anti-duplicados")
+        log.info("✅ Endpoints /api/notifications/ disponibles")
         
         if smtp_ready:
-            print("✅ Emails automáticos habilitados")
+            log.info("✅ Emails automáticos habilitados")
         else:
-            print("⚠️ Emails deshabilitados (configurar SMTP en .env)")
+            log.warning("⚠️ Emails deshabilitados (configurar SMTP en .env)")
         
-        print("\n🎯 Próximos pasos:")
-        print("1. Ejecutar: python scripts/test_vendor_notifications.py")
-        print("2. Probar endpoint: GET /api/notifications/")
-        print("3. Verificar dashboard con notificaciones")
+        log.info("\n🎯 Próximos pasos:")
+        log.info("1. Ejecutar: python scripts/test_vendor_notifications.py")
+        log.info("2. Probar endpoint: GET /api/notifications/")
+        log.info("3. Verificar dashboard con notificaciones")
         
     else:
-        print(f"\n❌ La configuración falló")
-        print("⚠️ Revisar errores arriba para identificar problemas")
+        log.error("\n❌ La configuración falló")
+        log.error("⚠️ Revisar errores arriba para identificar problemas")
     
-    print("\n" + "=" * 70)
+    log.info("\n" + "=" * 70)
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    
+    # Cargar variables de entorno
+    load_dotenv()
+    
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
+    
     main()
\ No newline at end of file
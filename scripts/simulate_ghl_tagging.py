@@ -7,22 +7,87 @@ import os
 import sys
 import json
 import time
+import logging
+from functools import lru_cache
 from datetime import datetime
 from pathlib import Path
 from decimal import Decimal
 
+# orjson es opcional: serialización más rápida de request_data, con fallback a json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Agregar el directorio raíz al path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, func, case, cast, select, insert, lambda_stmt, JSON
+from sqlalchemy.orm import sessionmaker, scoped_session, joinedload
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
 load_dotenv()
 
-from models import Payment, PaymentStatus, ClientAccount, AuditLog, AuditAction
-# Importar NotificationService solo cuando sea necesario para evitar problemas de imports
+# Los modelos (y NotificationService) se importan dentro de cada función: --help y los errores
+# de argumentos no pagan la construcción del metadata de SQLAlchemy
+
+# Logs de auditoría de simulación acumulados antes de escribirlos con bulk_save_objects
+AUDIT_BATCH_SIZE = 50
+
+# Reporte vía logging: con --quiet los mensajes informativos no se formatean ni se escriben
+logger = logging.getLogger("ghl_sim")
+
+def _dumps(data: dict) -> str:
+    """Serializa a JSON (str) con orjson si está disponible"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
+
+@lru_cache(maxsize=None)
+def _get_engine(database_url: str):
+    """Engine (y pool de conexiones) compartido por URL entre instancias del simulador"""
+    return create_engine(database_url, echo=False, pool_pre_ping=True, pool_size=5)
+
+def _request_data_field(dialect_name: str, key: str):
+    """
+    Expresión SQL que extrae request_data[key] en la base de datos, sin parsear el JSON en Python
+    """
+    from models import AuditLog
+    
+    if dialect_name == "postgresql":
+        return func.json_extract_path_text(cast(AuditLog.request_data, JSON), key)
+    
+    # SQLite/MySQL: json_extract falla con JSON inválido, así que se valida antes (NULL si no es válido)
+    return case(
+        (func.json_valid(AuditLog.request_data) == 1, func.json_extract(AuditLog.request_data, f"$.{key}"))
+    )
+
+@lru_cache(maxsize=None)
+def _recent_tagging_fields(dialect_name: str) -> tuple:
+    """Campos de request_data mostrados en la actividad reciente (construidos una vez por dialecto)"""
+    return tuple(
+        _request_data_field(dialect_name, key)
+        for key in ("tag_name", "status", "ghl_contact_id", "amount", "error")
+    )
+
+def _recent_tagging_stmt(dialect_name: str, limit: int):
+    """
+    Últimos eventos de tagging como lambda_stmt: la construcción y compilación del SELECT
+    se cachean entre llamadas y limit viaja como parámetro
+    """
+    from models import AuditLog, AuditAction
+    
+    fields = _recent_tagging_fields(dialect_name)
+    # Evaluado fuera de la lambda: un str es un parámetro válido, el Enum no es cacheable
+    ghl_tag_applied = AuditAction.GHL_TAG_APPLIED.value
+    return lambda_stmt(
+        lambda: select(AuditLog.id, AuditLog.timestamp, *fields)
+        .where(AuditLog.action == ghl_tag_applied)
+        .order_by(AuditLog.timestamp.desc())
+        .limit(limit)
+    )
 
 class GHLTaggingSimulator:
     """
@@ -32,34 +97,47 @@ class GHLTaggingSimulator:
     def __init__(self):
         # Configuración de base de datos
         database_url = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
-        self.engine = create_engine(database_url, echo=False)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.db = SessionLocal()
+        self.engine = _get_engine(database_url)
+        # expire_on_commit=False: el pago (y su client_account cargado en el mismo SELECT)
+        # se sigue leyendo después de cada commit sin volver a consultarlo
+        self.SessionLocal = scoped_session(
+            sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine)
+        )
+        self.db = self.SessionLocal()
         
-        print("🎯 SIMULADOR DE TAGGING GHL - SPRINT 2")
-        print("=" * 60)
+        # Logs de auditoría de simulación pendientes de escritura
+        self._pending_audit = []
+        
+        logger.info("🎯 SIMULADOR DE TAGGING GHL - SPRINT 2")
+        logger.info("=" * 60)
     
     def simulate_payment_approval_flow(self) -> bool:
         """
         Simula el flujo completo de aprobación de pago con tagging automático
         """
+        from models import PaymentStatus, AuditLog, AuditAction
+        
+        # Valores de Enum resueltos una vez por simulación (los modelos se importan de forma diferida,
+        # así que no pueden ser constantes de módulo)
+        ghl_tag_applied = AuditAction.GHL_TAG_APPLIED.value
+        
         try:
-            print("\n🔍 PASO 1: Buscando pago pendiente para simular...")
+            logger.info("\n🔍 PASO 1: Buscando pago pendiente para simular...")
             
             # Buscar un pago pendiente o crear uno de prueba
             payment = self._get_or_create_test_payment()
             
             if not payment:
-                print("❌ No se pudo obtener un pago para simular")
+                logger.error("❌ No se pudo obtener un pago para simular")
                 return False
             
-            print(f"✅ Pago encontrado: ID {payment.id}")
-            print(f"   📧 Cliente: {payment.customer_email}")
-            print(f"   💰 Monto: ${payment.expected_amount}")
-            print(f"   🏢 Cliente Account ID: {payment.client_account_id}")
-            print(f"   👤 GHL Contact ID: {payment.ghl_contact_id}")
+            logger.info("✅ Pago encontrado: ID %s", payment.id)
+            logger.info("   📧 Cliente: %s", payment.customer_email)
+            logger.info("   💰 Monto: $%s", payment.expected_amount)
+            logger.info("   🏢 Cliente Account ID: %s", payment.client_account_id)
+            logger.info("   👤 GHL Contact ID: %s", payment.ghl_contact_id)
             
-            print(f"\n🔄 PASO 2: Simulando aprobación del pago...")
+            logger.info("\n🔄 PASO 2: Simulando aprobación del pago...")
             
             # Simular cambio de estado a aprobado
             payment.status = PaymentStatus.APPROVED.value
@@ -69,11 +147,11 @@ class GHLTaggingSimulator:
             
             self.db.commit()
             
-            print(f"✅ Pago marcado como APROBADO")
-            print(f"   💳 MP Payment ID: {payment.mp_payment_id}")
-            print(f"   💰 Monto pagado: ${payment.paid_amount}")
+            logger.info("✅ Pago marcado como APROBADO")
+            logger.info("   💳 MP Payment ID: %s", payment.mp_payment_id)
+            logger.info("   💰 Monto pagado: $%s", payment.paid_amount)
             
-            print(f"\n🏷️ PASO 3: Activando sistema de tagging automático...")
+            logger.info("\n🏷️ PASO 3: Activando sistema de tagging automático...")
             
             # Inicializar servicio de notificaciones (que incluye tagging)
             try:
@@ -84,8 +162,8 @@ class GHLTaggingSimulator:
                 result = notification_service.notify_payment_approved(payment)
                 
             except ImportError as import_error:
-                print(f"⚠️ Error de importación: {import_error}")
-                print("🔧 Simulando resultado exitoso para demostración...")
+                logger.warning("⚠️ Error de importación: %s", import_error)
+                logger.info("🔧 Simulando resultado exitoso para demostración...")
                 result = {
                     "success": True,
                     "channels": ["simulation"],
@@ -95,10 +173,10 @@ class GHLTaggingSimulator:
                 # Crear log de auditoría manual para la simulación
                 audit_log = AuditLog(
                     payment_id=payment.id,
-                    action=AuditAction.GHL_TAG_APPLIED.value,
+                    action=ghl_tag_applied,
                     description=f"GHL tag 'Pago confirmado' aplicado al contacto {payment.ghl_contact_id} (SIMULACIÓN)",
                     performed_by="tagging_simulator",
-                    request_data=json.dumps({
+                    request_data=_dumps({
                         "payment_id": payment.id,
                         "ghl_contact_id": payment.ghl_contact_id,
                         "tag_name": "Pago confirmado",
@@ -110,215 +188,272 @@ class GHLTaggingSimulator:
                     correlation_id=f"ghl_tag_sim_{payment.id}_{int(time.time())}"
                 )
                 
-                self.db.add(audit_log)
-                self.db.commit()
+                self._queue_audit_log(audit_log)
                 
-                print("✅ Log de auditoría de simulación creado")
+                logger.info("✅ Log de auditoría de simulación encolado")
             except Exception as e:
-                print(f"❌ Error en notificación: {str(e)}")
+                logger.error("❌ Error en notificación: %s", e)
                 result = {"success": False, "error": str(e)}
             
-            print(f"\n📊 RESULTADO DEL TAGGING:")
-            print(f"   ✅ Éxito: {result.get('success', False)}")
+            logger.info("\n📊 RESULTADO DEL TAGGING:")
+            logger.info("   ✅ Éxito: %s", result.get('success', False))
             
             if result.get('success'):
                 channels = result.get('channels', [])
-                print(f"   📡 Canales usados: {', '.join(channels) if channels else 'Ninguno'}")
+                logger.info("   📡 Canales usados: %s", ', '.join(channels) if channels else 'Ninguno')
                 
                 # Mostrar detalles del tagging GHL
                 data = result.get('results', {})
                 for channel, channel_result in data.items():
                     if channel_result.get('success'):
-                        print(f"   ✅ {channel.upper()}: Exitoso")
+                        logger.info("   ✅ %s: Exitoso", channel.upper())
                     else:
-                        print(f"   ❌ {channel.upper()}: {channel_result.get('error', 'Error desconocido')}")
+                        logger.error("   ❌ %s: %s", channel.upper(), channel_result.get('error', 'Error desconocido'))
             else:
-                print(f"   ❌ Error: {result.get('error', 'Error desconocido')}")
+                logger.error("   ❌ Error: %s", result.get('error', 'Error desconocido'))
             
-            print(f"\n📋 PASO 4: Verificando logs de auditoría...")
+            logger.info("\n📋 PASO 4: Verificando logs de auditoría...")
             
-            # Buscar logs de tagging GHL
+            # El paso 4 lee los logs de auditoría: escribir primero los pendientes
+            self._flush_audit_logs()
+            
+            # Buscar logs de tagging GHL (idx_audit_payment_action_ts resuelve filtro y orden sin sort)
             ghl_tag_logs = self.db.query(AuditLog).filter(
                 AuditLog.payment_id == payment.id,
-                AuditLog.action == AuditAction.GHL_TAG_APPLIED.value
+                AuditLog.action == ghl_tag_applied
             ).order_by(AuditLog.timestamp.desc()).limit(5).all()
             
             if ghl_tag_logs:
-                print(f"✅ Encontrados {len(ghl_tag_logs)} logs de tagging GHL:")
+                logger.info("✅ Encontrados %s logs de tagging GHL:", len(ghl_tag_logs))
                 for log in ghl_tag_logs:
-                    request_data = {}
-                    if log.request_data:
-                        try:
-                            request_data = json.loads(log.request_data)
-                        except:
-                            request_data = {}
+                    request_data = log.get_request_data()
                     
                     tag_name = request_data.get('tag_name', 'N/A')
                     status = request_data.get('status', 'N/A')
                     contact_id = request_data.get('ghl_contact_id', 'N/A')
                     
-                    print(f"   📝 Log ID {log.id}:")
-                    print(f"      🏷️ Tag: '{tag_name}'")
-                    print(f"      📊 Estado: {status}")
-                    print(f"      👤 Contacto GHL: {contact_id}")
-                    print(f"      ⏰ Timestamp: {log.timestamp}")
+                    logger.info("   📝 Log ID %s:", log.id)
+                    logger.info("      🏷️ Tag: '%s'", tag_name)
+                    logger.info("      📊 Estado: %s", status)
+                    logger.info("      👤 Contacto GHL: %s", contact_id)
+                    logger.info("      ⏰ Timestamp: %s", log.timestamp)
                     
                     if status == 'success':
-                        print(f"      ✅ PaymentEvent: Tag aplicado exitosamente en GHL para el contacto {contact_id}")
+                        logger.info("      ✅ PaymentEvent: Tag aplicado exitosamente en GHL para el contacto %s", contact_id)
                     else:
                         error_msg = request_data.get('error', 'Error desconocido')
-                        print(f"      ❌ PaymentEvent: Error aplicando tag: {error_msg}")
+                        logger.error("      ❌ PaymentEvent: Error aplicando tag: %s", error_msg)
             else:
-                print("⚠️ No se encontraron logs de tagging GHL")
+                logger.warning("⚠️ No se encontraron logs de tagging GHL")
             
-            print(f"\n🎯 PASO 5: Verificando configuración del cliente...")
+            logger.info("\n🎯 PASO 5: Verificando configuración del cliente...")
             
-            # Mostrar configuración del cliente
+            # Mostrar configuración del cliente (relación ya cargada junto con el pago)
             if payment.client_account_id:
-                client_account = self.db.query(ClientAccount).filter(
-                    ClientAccount.id == payment.client_account_id
-                ).first()
+                client_account = payment.client_account
                 
                 if client_account:
-                    print(f"✅ Configuración del cliente '{client_account.client_id}':")
-                    print(f"   🏷️ Tag por defecto: '{client_account.default_tag_paid or 'Pago confirmado'}'")
-                    print(f"   🔄 Auto-tagging habilitado: {client_account.auto_tag_payments}")
-                    print(f"   📍 GHL Location ID: {client_account.ghl_location_id}")
-                    print(f"   🔑 Tiene token GHL: {'Sí' if client_account.ghl_access_token else 'No'}")
+                    logger.info("✅ Configuración del cliente '%s':", client_account.client_id)
+                    logger.info("   🏷️ Tag por defecto: '%s'", client_account.default_tag_paid or 'Pago confirmado')
+                    logger.info("   🔄 Auto-tagging habilitado: %s", client_account.auto_tag_payments)
+                    logger.info("   📍 GHL Location ID: %s", client_account.ghl_location_id)
+                    logger.info("   🔑 Tiene token GHL: %s", 'Sí' if client_account.ghl_access_token else 'No')
                 else:
-                    print("⚠️ No se encontró configuración del cliente")
+                    logger.warning("⚠️ No se encontró configuración del cliente")
             
-            print(f"\n🎉 SIMULACIÓN COMPLETADA EXITOSAMENTE")
-            print("=" * 60)
+            logger.info("\n🎉 SIMULACIÓN COMPLETADA EXITOSAMENTE")
+            logger.info("=" * 60)
             
             return True
             
         except Exception as e:
-            print(f"\n❌ ERROR EN LA SIMULACIÓN: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("\n❌ ERROR EN LA SIMULACIÓN: %s", e)
             return False
+        finally:
+            self.close()
+    
+    def _queue_audit_log(self, audit_log) -> None:
+        """Encola un log de auditoría; se escriben en lote al llegar a AUDIT_BATCH_SIZE"""
+        self._pending_audit.append(audit_log)
+        
+        if len(self._pending_audit) >= AUDIT_BATCH_SIZE:
+            self._flush_audit_logs()
+    
+    def _flush_audit_logs(self) -> None:
+        """
+        Escribe los logs de auditoría pendientes con bulk_save_objects (sin pasar por el
+        identity map ni recuperar IDs) y un único commit
+        """
+        if not self._pending_audit:
+            return
+        
+        try:
+            self.db.bulk_save_objects(self._pending_audit, return_defaults=False)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self._pending_audit.clear()
+    
+    def close(self) -> None:
+        """Escribe los logs de auditoría pendientes y cierra la sesión"""
+        try:
+            self._flush_audit_logs()
         finally:
             self.db.close()
     
-    def _get_or_create_test_payment(self) -> Payment:
+    def _get_or_create_test_payment(self) -> "Payment":
         """
         Obtiene un pago existente o crea uno de prueba para la simulación
         """
+        from models import Payment, PaymentStatus, ClientAccount
+        
+        pending_status = PaymentStatus.PENDING.value
+        
         try:
-            # Buscar un pago pendiente existente
-            existing_payment = self.db.query(Payment).filter(
-                Payment.status == PaymentStatus.PENDING.value,
+            # Buscar un pago pendiente existente (con su ClientAccount en el mismo SELECT)
+            existing_payment = self.db.query(Payment).options(
+                joinedload(Payment.client_account)
+            ).filter(
+                Payment.status == pending_status,
                 Payment.client_account_id.isnot(None),
                 Payment.ghl_contact_id.isnot(None)
             ).first()
             
             if existing_payment:
-                print(f"📋 Usando pago existente: {existing_payment.id}")
+                logger.info("📋 Usando pago existente: %s", existing_payment.id)
                 return existing_payment
             
-            print(f"🔧 Creando pago de prueba para simulación...")
+            logger.info("🔧 Creando pago de prueba para simulación...")
             
-            # Buscar o crear cliente de prueba
+            # Buscar o crear cliente de prueba (cliente y pago se insertan en una sola transacción).
+            # INSERT ... RETURNING devuelve la fila ya persistida en el mismo round-trip, sin
+            # pasar por el unit of work
+            client_created = False
             test_client = self.db.query(ClientAccount).filter(
                 ClientAccount.client_id == "cliente_prueba_oficial"
             ).first()
             
             if not test_client:
-                print("⚠️ Cliente de prueba no encontrado, creando uno nuevo...")
-                test_client = ClientAccount(
-                    client_id="cliente_prueba_oficial",
-                    client_name="Cliente Prueba Tagging",
-                    client_email="test@tagging-simulation.com",
-                    company_name="Empresa Simulación GHL",
-                    ghl_location_id="mock_location_cliente_prueba_oficial",
-                    ghl_access_token="mock_ghl_access_token_cliente_prueba_oficial_tagging",
-                    default_tag_paid="Pago confirmado",
-                    auto_tag_payments=True,
-                    is_active=True
-                )
-                self.db.add(test_client)
-                self.db.commit()
-                print(f"✅ Cliente de prueba creado: {test_client.client_id}")
+                logger.warning("⚠️ Cliente de prueba no encontrado, creando uno nuevo...")
+                test_client = self.db.scalars(
+                    insert(ClientAccount).values(
+                        client_id="cliente_prueba_oficial",
+                        client_name="Cliente Prueba Tagging",
+                        client_email="test@tagging-simulation.com",
+                        company_name="Empresa Simulación GHL",
+                        ghl_location_id="mock_location_cliente_prueba_oficial",
+                        ghl_access_token="mock_ghl_access_token_cliente_prueba_oficial_tagging",
+                        default_tag_paid="Pago confirmado",
+                        auto_tag_payments=True,
+                        is_active=True
+                    ).returning(ClientAccount)
+                ).one()
+                client_created = True
             
             # Crear pago de prueba
-            test_payment = Payment(
-                customer_email="cliente.tagging@simulation.com",
-                customer_name="Cliente Tagging Simulation",
-                ghl_contact_id=f"ghl_contact_tagging_{int(time.time())}",
-                client_account_id=test_client.id,
-                expected_amount=Decimal("150.00"),
-                currency="ARS",
-                status=PaymentStatus.PENDING.value,
-                created_by="tagging_simulator",
-                mp_preference_id=f"mock_pref_tagging_{int(time.time())}"
-            )
+            now_ts = int(time.time())
+            test_payment = self.db.scalars(
+                insert(Payment).values(
+                    customer_email="cliente.tagging@simulation.com",
+                    customer_name="Cliente Tagging Simulation",
+                    ghl_contact_id=f"ghl_contact_tagging_{now_ts}",
+                    client_account_id=test_client.id,
+                    expected_amount=Decimal("150.00"),
+                    currency="ARS",
+                    status=pending_status,
+                    created_by="tagging_simulator",
+                    mp_preference_id=f"mock_pref_tagging_{now_ts}"
+                ).returning(Payment)
+            ).one()
             
-            self.db.add(test_payment)
             self.db.commit()
             
-            print(f"✅ Pago de prueba creado: ID {test_payment.id}")
+            if client_created:
+                logger.info("✅ Cliente de prueba creado: %s", test_client.client_id)
+            logger.info("✅ Pago de prueba creado: ID %s", test_payment.id)
             return test_payment
             
         except Exception as e:
-            print(f"❌ Error creando pago de prueba: {str(e)}")
+            logger.error("❌ Error creando pago de prueba: %s", e)
             self.db.rollback()
             return None
     
-    def show_recent_tagging_activity(self):
+    def show_recent_tagging_activity(self, limit: int = 10):
         """
         Muestra la actividad reciente de tagging GHL
+        
+        Args:
+            limit: Cantidad máxima de eventos a mostrar
         """
         try:
-            print("\n📊 ACTIVIDAD RECIENTE DE TAGGING GHL")
-            print("=" * 50)
-            
-            # Buscar logs recientes de tagging
-            recent_logs = self.db.query(AuditLog).filter(
-                AuditLog.action == AuditAction.GHL_TAG_APPLIED.value
-            ).order_by(AuditLog.timestamp.desc()).limit(10).all()
-            
-            if not recent_logs:
-                print("📭 No hay actividad reciente de tagging GHL")
-                return
-            
-            print(f"📋 Últimos {len(recent_logs)} eventos de tagging:")
-            
-            for i, log in enumerate(recent_logs, 1):
-                request_data = {}
-                if log.request_data:
-                    try:
-                        request_data = json.loads(log.request_data)
-                    except:
-                        request_data = {}
-                
-                tag_name = request_data.get('tag_name', 'N/A')
-                status = request_data.get('status', 'N/A')
-                contact_id = request_data.get('ghl_contact_id', 'N/A')
-                amount = request_data.get('amount', 'N/A')
+            logger.info("\n📊 ACTIVIDAD RECIENTE DE TAGGING GHL")
+            logger.info("=" * 50)
+            
+            # Buscar logs recientes de tagging (idx_audit_action_timestamp), proyectando solo los
+            # campos de request_data que se muestran
+            dialect_name = self.db.get_bind().dialect.name
+            recent_logs = self.db.execute(
+                _recent_tagging_stmt(dialect_name, limit),
+                execution_options={"yield_per": 100}
+            )
+            
+            # Filas en lotes de yield_per en lugar de materializar todo el resultado con .all()
+            shown = 0
+            for i, (log_id, timestamp, tag_name, status, contact_id, amount, error) in enumerate(recent_logs, 1):
+                tag_name = tag_name if tag_name is not None else 'N/A'
+                status = status if status is not None else 'N/A'
+                contact_id = contact_id if contact_id is not None else 'N/A'
+                amount = amount if amount is not None else 'N/A'
                 
                 status_icon = "✅" if status == "success" else "❌"
                 
-                print(f"\n{i}. {status_icon} Log ID {log.id}")
-                print(f"   🏷️ Tag: '{tag_name}'")
-                print(f"   👤 Contacto: {contact_id}")
-                print(f"   💰 Monto: ${amount}")
-                print(f"   📊 Estado: {status}")
-                print(f"   ⏰ Fecha: {log.timestamp}")
+                if i == 1:
+                    logger.info("📋 Últimos eventos de tagging (máx. %s):", limit)
+                
+                logger.info("\n%s. %s Log ID %s", i, status_icon, log_id)
+                logger.info("   🏷️ Tag: '%s'", tag_name)
+                logger.info("   👤 Contacto: %s", contact_id)
+                logger.info("   💰 Monto: $%s", amount)
+                logger.info("   📊 Estado: %s", status)
+                logger.info("   ⏰ Fecha: %s", timestamp)
+                
+                if status != "success" and error:
+                    logger.info("   ❌ Error: %s", error)
                 
-                if status != "success" and request_data.get('error'):
-                    print(f"   ❌ Error: {request_data['error']}")
+                shown = i
+            
+            if not shown:
+                logger.info("📭 No hay actividad reciente de tagging GHL")
             
         except Exception as e:
-            print(f"❌ Error mostrando actividad: {str(e)}")
+            logger.error("❌ Error mostrando actividad: %s", e)
         finally:
-            self.db.close()
+            self.close()
 
 def main():
     """Función principal del simulador"""
-    print("🚀 SIMULADOR DE TAGGING GHL - SPRINT 2 RP PAY")
-    print("Automatización de Tags en GoHighLevel para Pagos Aprobados")
-    print("=" * 70)
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Simulador de tagging GHL para pagos aprobados")
+    parser.add_argument(
+        "--quiet",
+        "-q",
+        action="store_true",
+        help="Mostrar solo advertencias y errores"
+    )
+    args = parser.parse_args()
+    
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format="%(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    
+    logger.info("🚀 SIMULADOR DE TAGGING GHL - SPRINT 2 RP PAY")
+    logger.info("Automatización de Tags en GoHighLevel para Pagos Aprobados")
+    logger.info("=" * 70)
     
     simulator = GHLTaggingSimulator()
     
@@ -326,22 +461,22 @@ def main():
     simulator.show_recent_tagging_activity()
     
     # Ejecutar simulación
-    print(f"\n🎯 INICIANDO SIMULACIÓN DE FLUJO COMPLETO...")
+    logger.info("\n🎯 INICIANDO SIMULACIÓN DE FLUJO COMPLETO...")
     success = simulator.simulate_payment_approval_flow()
     
     if success:
-        print(f"\n🎉 ¡SIMULACIÓN EXITOSA!")
-        print("✅ El sistema de tagging automático está funcionando correctamente")
-        print("✅ Los logs muestran la aplicación exitosa de tags en GHL")
-        print("✅ Sprint 2 - Automatización de Tags: COMPLETADO")
+        logger.info("\n🎉 ¡SIMULACIÓN EXITOSA!")
+        logger.info("✅ El sistema de tagging automático está funcionando correctamente")
+        logger.info("✅ Los logs muestran la aplicación exitosa de tags en GHL")
+        logger.info("✅ Sprint 2 - Automatización de Tags: COMPLETADO")
     else:
-        print(f"\n❌ La simulación falló")
-        print("⚠️ Revisar logs para identificar problemas")
+        logger.error("\n❌ La simulación falló")
+        logger.error("⚠️ Revisar logs para identificar problemas")
     
-    print("\n" + "=" * 70)
-    print("Para ver los logs en tiempo real:")
-    print("tail -f logs/app.log | grep 'PaymentEvent\\|GHL\\|Tag'")
-    print("=" * 70)
+    logger.info("\n" + "=" * 70)
+    logger.info("Para ver los logs en tiempo real:")
+    logger.info("tail -f logs/app.log | grep 'PaymentEvent\\|GHL\\|Tag'")
+    logger.info("=" * 70)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,22 +5,26 @@ Ejecuta verificaciones periódicas del sistema de alertas
 """
 import sys
 import os
+import time
 import asyncio
 import logging
-from datetime import datetime
+import argparse
+from functools import lru_cache
+from datetime import datetime, timezone
 from pathlib import Path
 
 # Agregar el directorio raíz al path para imports
 sys.path.append(str(Path(__file__).parent.parent))
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
 load_dotenv()
 
-from services import AlertService
+# El entorno no cambia durante el proceso: se lee una sola vez
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
 
 # Configurar logging
 logging.basicConfig(
@@ -34,13 +38,24 @@ logging.basicConfig(
 
 logger = logging.getLogger("alert_monitoring")
 
+# Ícono por nivel de alerta (AlertLevel.value) para el reporte de run_single_check
+LEVEL_ICONS = {"critical": "🔥", "warning": "⚠️"}
+
+@lru_cache(maxsize=None)
+def _get_engine(database_url: str):
+    """Engine (y pool de conexiones) compartido por URL entre instancias de AlertMonitor"""
+    return create_engine(database_url, echo=False, pool_pre_ping=True, pool_size=5)
+
 class AlertMonitor:
     """Monitor automático de alertas para ejecución continua"""
     
     def __init__(self):
-        self.database_url = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
-        self.engine = create_engine(self.database_url, echo=False)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.database_url = DATABASE_URL
+        self.engine = _get_engine(self.database_url)
+        # _session_factory: sesiones independientes para las reglas verificadas en paralelo;
+        # SessionLocal: sesión por hilo para el resto del monitor
+        self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.SessionLocal = scoped_session(self._session_factory)
         
         # Crear directorio de logs si no existe
         os.makedirs("logs", exist_ok=True)
@@ -56,52 +71,81 @@ class AlertMonitor:
         """
         logger.info(f"Starting alert monitoring - Check interval: {check_interval_seconds}s")
         
+        # Próxima ejecución anclada al reloj monotónico del loop: la duración de cada
+        # verificación no desplaza la cadencia
+        loop = asyncio.get_running_loop()
+        next_run = loop.time()
+        
         while True:
             try:
                 await self.run_alert_check()
                 
+                next_run += check_interval_seconds
+                now = loop.time()
+                
+                # Si la verificación excedió el intervalo, saltar a la próxima ranura en lugar de acumular ejecuciones
+                if next_run < now:
+                    skipped = int((now - next_run) // check_interval_seconds) + 1
+                    logger.warning(f"Alert check overran the {check_interval_seconds}s interval - skipping {skipped} slot(s)")
+                    next_run += skipped * check_interval_seconds
+                
                 # Esperar hasta la próxima verificación
-                await asyncio.sleep(check_interval_seconds)
+                await asyncio.sleep(next_run - now)
                 
             except KeyboardInterrupt:
                 logger.info("Alert monitoring stopped by user")
                 break
             except Exception as e:
                 logger.error(f"Error in alert monitoring loop: {str(e)}")
-                # Esperar un poco antes de reintentar
+                # Esperar un poco antes de reintentar y re-anclar la cadencia
                 await asyncio.sleep(60)
+                next_run = loop.time()
     
     async def run_alert_check(self):
         """Ejecuta una verificación de alertas"""
-        start_time = datetime.utcnow()
+        # Reloj monotónico para la duración: no le afectan los ajustes del reloj de pared (NTP)
+        start_time = time.monotonic()
+        
+        # Import diferido: --help y los errores de argumentos no cargan servicios ni modelos
+        from services import AlertService
         
         try:
             db = self.SessionLocal()
             
             try:
+                # Las reglas se verifican en paralelo (asyncio.gather sobre el thread pool del loop),
+                # cada una con su propia sesión; el loop no se bloquea con SQLAlchemy síncrono
                 alert_service = AlertService(db)
-                alerts_generated = alert_service.check_all_alerts()
-                
-                duration = (datetime.utcnow() - start_time).total_seconds()
+                alerts_generated = await alert_service.check_all_alerts_async(self._session_factory)
                 
-                if alerts_generated:
-                    logger.warning(f"Alert check completed - {len(alerts_generated)} alerts generated in {duration:.2f}s")
-                    
-                    # Log detalles de alertas críticas
-                    critical_alerts = [a for a in alerts_generated if a.level.value == "critical"]
-                    if critical_alerts:
-                        logger.critical(f"CRITICAL ALERTS DETECTED: {len(critical_alerts)} critical alerts require immediate attention")
-                else:
-                    logger.info(f"Alert check completed - No alerts generated in {duration:.2f}s")
+                duration = time.monotonic() - start_time
+                counts = alert_service.count_by_level(alerts_generated)
                 
             finally:
-                db.close()
+                self.SessionLocal.remove()
+            
+            if alerts_generated:
+                logger.warning(f"Alert check completed - {len(alerts_generated)} alerts generated in {duration:.2f}s")
+                
+                # Detalle por alerta solo con --verbose
+                if logger.isEnabledFor(logging.DEBUG):
+                    for alert in alerts_generated:
+                        logger.debug(f"[{alert.level.value.upper()}] {alert.title}: {alert.message}")
+                
+                # Log detalles de alertas críticas
+                critical_count = counts.get("critical", 0)
+                if critical_count:
+                    logger.critical(f"CRITICAL ALERTS DETECTED: {critical_count} critical alerts require immediate attention")
+            else:
+                logger.info(f"Alert check completed - No alerts generated in {duration:.2f}s")
                 
         except Exception as e:
             logger.error(f"Error in alert check: {str(e)}")
     
     def run_single_check(self):
         """Ejecuta una sola verificación de alertas (modo síncrono)"""
+        from services import AlertService
+        
         try:
             db = self.SessionLocal()
             
@@ -110,15 +154,15 @@ class AlertMonitor:
                 alerts_generated = alert_service.check_all_alerts()
                 
                 print(f"\n{'='*60}")
-                print(f"ALERT CHECK RESULTS - {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}")
+                print(f"ALERT CHECK RESULTS - {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')}")
                 print(f"{'='*60}")
                 
                 if alerts_generated:
                     print(f"🚨 {len(alerts_generated)} alerts generated:")
                     
                     for alert in alerts_generated:
-                        level_icon = "🔥" if alert.level.value == "critical" else "⚠️" if alert.level.value == "warning" else "ℹ️"
-                        print(f"{level_icon} [{alert.level.value.upper()}] {alert.title}")
+                        level = alert.level.value
+                        print(f"{LEVEL_ICONS.get(level, 'ℹ️')} [{level.upper()}] {alert.title}")
                         print(f"   {alert.message}")
                         print(f"   Value: {alert.current_value} | Threshold: {alert.threshold_value}")
                         print()
@@ -130,17 +174,15 @@ class AlertMonitor:
                 return len(alerts_generated)
                 
             finally:
-                db.close()
+                self.SessionLocal.remove()
                 
         except Exception as e:
             logger.error(f"Error in single alert check: {str(e)}")
             print(f"❌ Error checking alerts: {str(e)}")
             return -1
 
-def main():
-    """Función principal del script"""
-    import argparse
-    
+def _build_parser() -> argparse.ArgumentParser:
+    """Construye el parser de argumentos del script"""
     parser = argparse.ArgumentParser(
         description="Alert Monitoring System for MercadoPago Enterprise",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -167,7 +209,14 @@ def main():
         help="Enable verbose logging"
     )
     
-    args = parser.parse_args()
+    return parser
+
+# Parser construido una vez al importar (reutilizable desde tests)
+_PARSER = _build_parser()
+
+def main():
+    """Función principal del script"""
+    args = _PARSER.parse_args()
     
     # Configurar nivel de logging
     if args.verbose:
@@ -178,7 +227,7 @@ def main():
         print("ERROR: --interval must be positive", file=sys.stderr)
         return 2
     
-    print(f"Alert Monitoring System - {datetime.utcnow().isoformat()}")
+    print(f"Alert Monitoring System - {datetime.now(timezone.utc).isoformat()}")
     print(f"Mode: {args.mode}")
     if args.mode == "continuous":
         print(f"Check interval: {args.interval} seconds")
@@ -23,15 +23,9 @@ def get_db_path():
     
     return db_path
 
-def column_exists(cursor, table_name, column_name):
-    """Verifica si una columna existe en una tabla"""
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = [row[1] for row in cursor.fetchall()]
-    return column_name in columns
-
 def table_exists(cursor, table_name):
     """Verifica si una tabla existe"""
-    cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
     return cursor.fetchone() is not None
 
 def update_database():
@@ -50,6 +44,12 @@ def update_database():
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
+        # WAL + synchronous=NORMAL: los lectores no se bloquean durante los ALTER TABLE
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")
+        
         print("✅ Conexión establecida")
         
         # Verificar que la tabla payments existe
@@ -70,6 +70,11 @@ def update_database():
             }
         ]
         
+        # Estructura de payments leída una sola vez; todas las verificaciones usan este resultado
+        cursor.execute("PRAGMA table_info(payments)")
+        payment_columns = cursor.fetchall()
+        existing_columns = {row[1] for row in payment_columns}
+        
         # Verificar y agregar columnas faltantes
         columns_added = 0
         columns_skipped = 0
@@ -79,7 +84,7 @@ def update_database():
             column_def = column_info['definition']
             description = column_info['description']
             
-            if column_exists(cursor, 'payments', column_name):
+            if column_name in existing_columns:
                 print(f"⏭️  Columna '{column_name}' ya existe - omitiendo")
                 columns_skipped += 1
             else:
@@ -101,6 +106,16 @@ def update_database():
                 ON payments(mp_account_id)
             """)
             print("✅ Índice idx_payment_mp_account verificado/creado")
+            
+            # Logs de auditoría por pago y acción ordenados por fecha (reemplaza idx_audit_payment_action,
+            # que queda cubierto como prefijo del nuevo índice)
+            if table_exists(cursor, 'audit_logs'):
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_audit_payment_action_ts
+                    ON audit_logs(payment_id, action, timestamp)
+                """)
+                cursor.execute("DROP INDEX IF EXISTS idx_audit_payment_action")
+                print("✅ Índice idx_audit_payment_action_ts verificado/creado")
         except Exception as e:
             print(f"⚠️  Advertencia creando índice: {str(e)}")
         
@@ -116,9 +131,11 @@ def update_database():
         
         # Mostrar estructura actual de la tabla
         print("\n📋 Estructura actual de la tabla 'payments':")
-        cursor.execute("PRAGMA table_info(payments)")
-        columns = cursor.fetchall()
-        for col in columns:
+        if columns_added:
+            # Solo se vuelve a leer si algún ALTER TABLE cambió la estructura
+            cursor.execute("PRAGMA table_info(payments)")
+            payment_columns = cursor.fetchall()
+        for col in payment_columns:
             col_id, col_name, col_type, not_null, default_val, pk = col
             nullable = "NOT NULL" if not_null else "NULL"
             pk_marker = " (PK)" if pk else ""
@@ -10,12 +10,30 @@ from pathlib import Path
 # Agregar el directorio raíz al path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, inspect, text
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
 load_dotenv()
 
+def get_engine():
+    """Crea el engine de la migración (en SQLite con WAL + synchronous=NORMAL)"""
+    database_url = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
+    engine = create_engine(database_url, echo=False)
+    
+    if engine.dialect.name == "sqlite":
+        # WAL + synchronous=NORMAL antes del ALTER TABLE: los lectores no se bloquean
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _):
+            cursor = dbapi_conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-64000")
+            cursor.close()
+    
+    return engine
+
 def update_database_for_tagging():
     """
     Actualiza la base de datos para soportar el sistema de tagging GHL
@@ -25,53 +43,90 @@ def update_database_for_tagging():
     
     try:
         # Conectar a la base de datos
-        database_url = os.getenv("DATABASE_URL", "sqlite:///./mercadopago_enterprise.db")
-        engine = create_engine(database_url, echo=False)
+        engine = get_engine()
+        database_url = engine.url.render_as_string(hide_password=True)
         
         print(f"📊 Conectando a: {database_url}")
         
-        with engine.connect() as conn:
-            # Verificar si la columna ya existe
-            try:
-                result = conn.execute(text("SELECT default_tag_paid FROM client_accounts LIMIT 1"))
-                print("✅ La columna default_tag_paid ya existe")
-                return True
-            except Exception:
-                print("🔧 La columna default_tag_paid no existe, agregándola...")
-            
-            # Agregar la nueva columna
-            try:
+        # Índice único sobre client_id (búsquedas por cliente en O(log N)). Las tablas creadas por
+        # los modelos o por setup_multitenant_database.py ya lo tienen vía UNIQUE; solo se crea si falta
+        inspector = inspect(engine)
+        client_id_unique = any(
+            index["column_names"] == ["client_id"] and index["unique"]
+            for index in inspector.get_indexes("client_accounts")
+        ) or any(
+            constraint["column_names"] == ["client_id"]
+            for constraint in inspector.get_unique_constraints("client_accounts")
+        )
+        if client_id_unique:
+            print("✅ Índice único sobre client_accounts.client_id verificado")
+        else:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS ix_client_accounts_client_id ON client_accounts(client_id)"
+                ))
+            print("✅ Índice ix_client_accounts_client_id creado")
+        
+        # Verificar si la columna ya existe (catálogo: PRAGMA table_info en SQLite, sin SELECT fallido)
+        columns = {column["name"] for column in inspector.get_columns("client_accounts")}
+        if "default_tag_paid" in columns:
+            print("✅ La columna default_tag_paid ya existe")
+            return True
+        
+        print("🔧 La columna default_tag_paid no existe, agregándola...")
+        
+        # Agregar la nueva columna en una sola transacción. ADD COLUMN ... DEFAULT ya completa
+        # las filas existentes con 'Pago confirmado', por eso no hace falta un UPDATE posterior
+        try:
+            with engine.begin() as conn:
                 conn.execute(text("""
                     ALTER TABLE client_accounts 
                     ADD COLUMN default_tag_paid VARCHAR(100) DEFAULT 'Pago confirmado'
                 """))
-                conn.commit()
-                print("✅ Columna default_tag_paid agregada exitosamente")
-                
-                # Actualizar registros existentes
-                conn.execute(text("""
-                    UPDATE client_accounts 
-                    SET default_tag_paid = 'Pago confirmado' 
-                    WHERE default_tag_paid IS NULL
-                """))
-                conn.commit()
-                print("✅ Registros existentes actualizados")
-                
-                # Verificar la actualización
-                result = conn.execute(text("SELECT COUNT(*) FROM client_accounts WHERE default_tag_paid IS NOT NULL"))
-                count = result.scalar()
-                print(f"✅ {count} registros tienen configurado default_tag_paid")
-                
-                return True
-                
-            except Exception as e:
-                print(f"❌ Error agregando columna: {str(e)}")
-                return False
-                
+                count = conn.execute(text("SELECT COUNT(*) FROM client_accounts")).scalar()
+            
+            print("✅ Columna default_tag_paid agregada exitosamente")
+            print(f"✅ {count} registros tienen configurado default_tag_paid")
+            
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error agregando columna: {str(e)}")
+            return False
+            
     except Exception as e:
         print(f"❌ Error conectando a la base de datos: {str(e)}")
         return False
 
+def update_database_for_notification_dedup():
+    """
+    Crea el índice único parcial que garantiza un solo evento notification_sent por pago
+    (lo usa VendorNotificationService con INSERT ... ON CONFLICT DO NOTHING)
+    """
+    print("\n🔧 ÍNDICE ANTI-DUPLICADOS DE NOTIFICACIONES VENDEDOR")
+    print("=" * 60)
+    
+    try:
+        engine = get_engine()
+        
+        if not inspect(engine).has_table("payment_events"):
+            print("⏭️ La tabla payment_events no existe (python scripts/setup_vendor_notifications.py)")
+            return True
+        
+        with engine.begin() as conn:
+            conn.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS ux_payment_event_notification_sent
+                ON payment_events(payment_id) WHERE event_type = 'notification_sent'
+            """))
+        
+        print("✅ Índice ux_payment_event_notification_sent verificado/creado")
+        return True
+        
+    except Exception as e:
+        # Falla si ya hay eventos notification_sent duplicados para un mismo pago
+        print(f"❌ Error creando índice anti-duplicados: {str(e)}")
+        return False
+
 def main():
     """Función principal"""
     print("🚀 MIGRACIÓN DE BASE DE DATOS - SPRINT 2 TAGGING GHL")
@@ -79,6 +134,7 @@ def main():
     print("=" * 70)
     
     success = update_database_for_tagging()
+    success = update_database_for_notification_dedup() and success
     
     if success:
         print(f"\n🎉 ¡MIGRACIÓN COMPLETADA EXITOSAMENTE!")
@@ -5,9 +5,14 @@ Verifica que todas las funcionalidades estén operativas
 """
 import sys
 import os
+import atexit
+import threading
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Agregar el directorio raíz al path para imports
 sys.path.append(str(Path(__file__).parent.parent))
@@ -19,105 +24,122 @@ load_dotenv()
 BASE_URL = "http://localhost:8000"
 ADMIN_TOKEN = os.getenv("ADMIN_API_KEY", "junior123")
 
-def verify_multitenant_system():
-    """
-    Verificación completa del sistema multi-tenant
-    """
-    print("🚀 VERIFICACIÓN PROYECTO INTEGRADOR MULTI-TENANT")
-    print("="*70)
-    
-    results = {
-        "server_running": False,
-        "database_migrated": False,
-        "ghl_oauth_working": False,
-        "client_created": False,
-        "integrations_healthy": False,
-        "dashboard_accessible": False
-    }
-    
-    # 1. Verificar servidor
-    print("\n🔍 1. Verificando servidor...")
+# (connect, read): un host caído falla en ~1s en lugar de agotar un timeout único de 10s
+REQUEST_TIMEOUT = (1.0, 5.0)
+
+# Se marca al primer fallo de conexión: el resto de verificaciones al mismo host se omiten
+HOST_DEAD = threading.Event()
+
+class HostUnreachable(Exception):
+    """Verificación omitida porque el servidor ya demostró no ser alcanzable"""
+
+def _build_session() -> requests.Session:
+    """Sesión HTTP compartida por todas las verificaciones (keep-alive + reintentos ante 502/503/504)"""
+    session = requests.Session()
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"])
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+SESSION = _build_session()
+atexit.register(SESSION.close)
+
+def _get(url: str, **kwargs) -> requests.Response:
+    """GET con la sesión compartida; tras un fallo de conexión no vuelve a intentar el host"""
+    if HOST_DEAD.is_set():
+        raise HostUnreachable("omitida: servidor no alcanzable")
     try:
-        response = requests.get(f"{BASE_URL}/dashboard", timeout=5)
-        if response.status_code == 200:
-            print("   ✅ Servidor corriendo correctamente")
-            results["server_running"] = True
-        else:
-            print(f"   ❌ Servidor responde con error: {response.status_code}")
-    except Exception as e:
-        print(f"   ❌ Servidor no disponible: {str(e)}")
-        return results
-    
-    # 2. Verificar migración de base de datos
-    print("\n🗄️  2. Verificando migración multi-tenant...")
+        return SESSION.get(url, timeout=REQUEST_TIMEOUT, **kwargs)
+    except requests.exceptions.ConnectionError:
+        HOST_DEAD.set()
+        raise
+
+def check_database():
+    """2. Verifica la migración de base de datos multi-tenant"""
+    lines = ["\n🗄️  2. Verificando migración multi-tenant..."]
+    ok = False
     try:
         headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
-        response = requests.get(f"{BASE_URL}/api/v1/dashboard/overview", headers=headers, timeout=10)
+        response = _get(f"{BASE_URL}/api/v1/dashboard/overview", headers=headers)
         
         if response.status_code == 200:
-            print("   ✅ Base de datos multi-tenant funcionando")
-            results["database_migrated"] = True
+            lines.append("   ✅ Base de datos multi-tenant funcionando")
+            ok = True
         else:
-            print(f"   ❌ Error accediendo base de datos: {response.status_code}")
+            lines.append(f"   ❌ Error accediendo base de datos: {response.status_code}")
     except Exception as e:
-        print(f"   ❌ Error verificando base de datos: {str(e)}")
+        lines.append(f"   ❌ Error verificando base de datos: {str(e)}")
     
-    # 3. Verificar OAuth GHL
-    print("\n🔐 3. Verificando OAuth GoHighLevel...")
+    return "database_migrated", ok, lines
+
+def check_ghl_oauth():
+    """3. Verifica la generación de URLs OAuth de GoHighLevel"""
+    lines = ["\n🔐 3. Verificando OAuth GoHighLevel..."]
+    ok = False
     try:
-        response = requests.get(
-            f"{BASE_URL}/oauth/ghl/authorize?client_id=test_verification",
-            timeout=10
-        )
+        response = _get(f"{BASE_URL}/oauth/ghl/authorize?client_id=test_verification")
         
         if response.status_code == 200:
             auth_data = response.json()
             if "authorization_url" in auth_data:
-                print("   ✅ OAuth GHL generando URLs correctamente")
-                print(f"   🔗 Client ID configurado: {auth_data.get('client_id')}")
-                results["ghl_oauth_working"] = True
+                lines.append("   ✅ OAuth GHL generando URLs correctamente")
+                lines.append(f"   🔗 Client ID configurado: {auth_data.get('client_id')}")
+                ok = True
             else:
-                print("   ❌ OAuth GHL no retorna URL válida")
+                lines.append("   ❌ OAuth GHL no retorna URL válida")
         else:
-            print(f"   ❌ Error en OAuth GHL: {response.status_code}")
+            lines.append(f"   ❌ Error en OAuth GHL: {response.status_code}")
     except Exception as e:
-        print(f"   ❌ Error verificando OAuth GHL: {str(e)}")
+        lines.append(f"   ❌ Error verificando OAuth GHL: {str(e)}")
     
-    # 4. Verificar cliente simulado
-    print("\n👤 4. Verificando cliente simulado...")
+    return "ghl_oauth_working", ok, lines
+
+def check_simulated_client():
+    """4. Verifica el cliente simulado y su conexión con GHL"""
+    lines = ["\n👤 4. Verificando cliente simulado..."]
+    ok = False
     try:
         headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
-        response = requests.get(
+        response = _get(
             f"{BASE_URL}/oauth/ghl/status/cliente_prueba_oficial",
-            headers=headers,
-            timeout=10
+            headers=headers
         )
         
         if response.status_code == 200:
             client_data = response.json()
             if client_data.get("ghl_integration", {}).get("connected"):
-                print("   ✅ Cliente simulado creado y conectado")
-                print(f"   👤 Nombre: {client_data.get('client_name')}")
-                print(f"   🏢 Location: {client_data['ghl_integration']['location_id']}")
-                results["client_created"] = True
+                lines.append("   ✅ Cliente simulado creado y conectado")
+                lines.append(f"   👤 Nombre: {client_data.get('client_name')}")
+                lines.append(f"   🏢 Location: {client_data['ghl_integration']['location_id']}")
+                ok = True
             else:
-                print("   ⚠️  Cliente existe pero no está conectado a GHL")
+                lines.append("   ⚠️  Cliente existe pero no está conectado a GHL")
         elif response.status_code == 404:
-            print("   ⚠️  Cliente simulado no encontrado")
-            print("   💡 Ejecuta: python scripts/simulate_ghl_oauth_callback.py")
+            lines.append("   ⚠️  Cliente simulado no encontrado")
+            lines.append("   💡 Ejecuta: python scripts/simulate_ghl_oauth_callback.py")
         else:
-            print(f"   ❌ Error verificando cliente: {response.status_code}")
+            lines.append(f"   ❌ Error verificando cliente: {response.status_code}")
     except Exception as e:
-        print(f"   ❌ Error verificando cliente: {str(e)}")
+        lines.append(f"   ❌ Error verificando cliente: {str(e)}")
     
-    # 5. Verificar integraciones
-    print("\n🔗 5. Verificando estado de integraciones...")
+    return "client_created", ok, lines
+
+def check_integrations():
+    """5. Verifica el estado de las integraciones en las métricas en tiempo real"""
+    lines = ["\n🔗 5. Verificando estado de integraciones..."]
+    ok = False
     try:
         headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
-        response = requests.get(
+        response = _get(
             f"{BASE_URL}/api/v1/dashboard/metrics/realtime",
-            headers=headers,
-            timeout=10
+            headers=headers
         )
         
         if response.status_code == 200:
@@ -129,33 +151,86 @@ def verify_multitenant_system():
             db_status = integrations.get("database_status", "UNKNOWN")
             active_clients = integrations.get("active_ghl_clients", 0)
             
-            print(f"   🔗 GoHighLevel: {ghl_status}")
-            print(f"   💳 MercadoPago: {mp_status}")
-            print(f"   🗄️  Base de Datos: {db_status}")
-            print(f"   👥 Clientes GHL Activos: {active_clients}")
+            lines.append(f"   🔗 GoHighLevel: {ghl_status}")
+            lines.append(f"   💳 MercadoPago: {mp_status}")
+            lines.append(f"   🗄️  Base de Datos: {db_status}")
+            lines.append(f"   👥 Clientes GHL Activos: {active_clients}")
             
             if ghl_status == "HEALTHY" and mp_status == "HEALTHY" and db_status == "HEALTHY":
-                print("   ✅ Todas las integraciones están HEALTHY")
-                results["integrations_healthy"] = True
+                lines.append("   ✅ Todas las integraciones están HEALTHY")
+                ok = True
             else:
-                print("   ⚠️  Algunas integraciones no están HEALTHY")
+                lines.append("   ⚠️  Algunas integraciones no están HEALTHY")
         else:
-            print(f"   ❌ Error obteniendo métricas: {response.status_code}")
+            lines.append(f"   ❌ Error obteniendo métricas: {response.status_code}")
     except Exception as e:
-        print(f"   ❌ Error verificando integraciones: {str(e)}")
+        lines.append(f"   ❌ Error verificando integraciones: {str(e)}")
+    
+    return "integrations_healthy", ok, lines
+
+def check_dashboard():
+    """6. Verifica que el dashboard sea accesible"""
+    lines = ["\n📊 6. Verificando dashboard..."]
+    ok = False
+    try:
+        response = _get(f"{BASE_URL}/dashboard")
+        if response.status_code == 200:
+            lines.append("   ✅ Dashboard accesible")
+            lines.append(f"   🌐 URL: {BASE_URL}/dashboard")
+            ok = True
+        else:
+            lines.append(f"   ❌ Dashboard no accesible: {response.status_code}")
+    except Exception as e:
+        lines.append(f"   ❌ Error accediendo dashboard: {str(e)}")
+    
+    return "dashboard_accessible", ok, lines
+
+# Verificaciones independientes entre sí: se ejecutan en paralelo una vez confirmado el servidor
+PARALLEL_CHECKS = (
+    check_database,
+    check_ghl_oauth,
+    check_simulated_client,
+    check_integrations,
+    check_dashboard,
+)
+
+def verify_multitenant_system():
+    """
+    Verificación completa del sistema multi-tenant
+    """
+    print("🚀 VERIFICACIÓN PROYECTO INTEGRADOR MULTI-TENANT")
+    print("="*70)
     
-    # 6. Verificar dashboard
-    print("\n📊 6. Verificando dashboard...")
+    results = {
+        "server_running": False,
+        "database_migrated": False,
+        "ghl_oauth_working": False,
+        "client_created": False,
+        "integrations_healthy": False,
+        "dashboard_accessible": False
+    }
+    
+    # 1. Verificar servidor (si no responde, el resto de verificaciones no tiene sentido)
+    print("\n🔍 1. Verificando servidor...")
     try:
-        response = requests.get(f"{BASE_URL}/dashboard", timeout=10)
+        response = _get(f"{BASE_URL}/dashboard")
         if response.status_code == 200:
-            print("   ✅ Dashboard accesible")
-            print(f"   🌐 URL: {BASE_URL}/dashboard")
-            results["dashboard_accessible"] = True
+            print("   ✅ Servidor corriendo correctamente")
+            results["server_running"] = True
         else:
-            print(f"   ❌ Dashboard no accesible: {response.status_code}")
+            print(f"   ❌ Servidor responde con error: {response.status_code}")
     except Exception as e:
-        print(f"   ❌ Error accediendo dashboard: {str(e)}")
+        print(f"   ❌ Servidor no disponible: {str(e)}")
+        return results
+    
+    # 2-6. Verificaciones en paralelo: la duración total es la de la más lenta, no la suma.
+    # La salida de cada una se imprime después, en el orden original
+    with ThreadPoolExecutor(max_workers=len(PARALLEL_CHECKS)) as executor:
+        outcomes = list(executor.map(lambda check: check(), PARALLEL_CHECKS))
+    
+    for key, ok, lines in outcomes:
+        print("\n".join(lines))
+        results[key] = ok
     
     return results
 
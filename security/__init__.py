@@ -6,8 +6,7 @@ Implements banking-grade security and immutable audit logging
 from .blockchain_audit import BlockchainAuditLogger, AuditBlockchain
 from .data_masking import sensitive_data_filter, DataMasker
 from .correlation_middleware import CorrelationMiddleware, get_correlation_id
-from .structured_logging import StructuredLogger, setup_structured_logging
-from .secure_export import SecureLogExporter
+from .response_cache import ResponseCacheMiddleware
 
 __all__ = [
     'BlockchainAuditLogger',
@@ -16,7 +15,21 @@ __all__ = [
     'DataMasker',
     'CorrelationMiddleware',
     'get_correlation_id',
-    'StructuredLogger',
-    'setup_structured_logging',
-    'SecureLogExporter'
-]
\ No newline at end of file
+    'ResponseCacheMiddleware'
+]
+
+# Logging estructurado y exportación segura son opcionales: sin ellos el resto del paquete
+# (middlewares, auditoría, enmascaramiento) sigue siendo importable desde main.py
+try:
+    from .structured_logging import StructuredLogger, setup_structured_logging
+    __all__ += ['StructuredLogger', 'setup_structured_logging']
+    STRUCTURED_LOGGING_AVAILABLE = True
+except ImportError:
+    STRUCTURED_LOGGING_AVAILABLE = False
+
+try:
+    from .secure_export import SecureLogExporter
+    __all__ += ['SecureLogExporter']
+    SECURE_EXPORT_AVAILABLE = True
+except ImportError:
+    SECURE_EXPORT_AVAILABLE = False
\ No newline at end of file
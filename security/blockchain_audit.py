@@ -5,22 +5,121 @@ Implements SHA-256 hash chain for tamper-proof audit logs
 import hashlib
 import json
 import time
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, select, delete
+from sqlalchemy.exc import IntegrityError
 import logging
 
-from models import AuditLog, AuditAction
+from models import AuditLog, AuditAction, BlockchainCheckpoint
+from .data_masking import DataMasker
 
 logger = logging.getLogger("blockchain_audit")
 
+# Bloques leídos por lote al verificar la cadena (streaming, memoria O(lote))
+VERIFY_BATCH_SIZE = 1000
+
+# Máximo de incidencias detalladas por tipo en el reporte de verificación
+MAX_REPORTED_ISSUES = 100
+
+# Origen de timestamp_ns (los timestamps del modelo son UTC naive)
+EPOCH = datetime(1970, 1, 1)
+
+# Fila única de blockchain_checkpoint
+CHECKPOINT_ID = 1
+
+# Reintentos cuando otro proceso insertó el mismo block_number (índice único idx_audit_block_unique)
+HEAD_CONFLICT_RETRIES = 3
+HEAD_CONFLICT_INDEX = "idx_audit_block_unique"
+
+def is_head_conflict(error: IntegrityError) -> bool:
+    """
+    Indica si el IntegrityError viene del índice único de block_number (otro escritor ocupó
+    la cabeza) y no de otra restricción
+    """
+    message = str(error.orig)
+    # PostgreSQL nombra el índice; SQLite solo informa la columna
+    return HEAD_CONFLICT_INDEX in message or "audit_logs.block_number" in message
+
+def datetime_to_ns(value: datetime) -> int:
+    """Convierte un datetime UTC naive a nanosegundos desde epoch (aritmética entera, sin floats)"""
+    return (value - EPOCH) // timedelta(microseconds=1) * 1000
+
+def build_block_hash_input(
+    block_number: int,
+    previous_hash: str,
+    timestamp_ns: int,
+    action: str,
+    performed_by: str,
+    description: str,
+    data_payload: str
+) -> bytes:
+    """
+    Construye los bytes que se hashean para un bloque de auditoría
+    Incluye todos los campos críticos para garantizar integridad, en formato binario fijo
+    (sin JSON ni nonce: block_number + previous_hash ya hacen único cada bloque y el hash
+    queda determinístico para poder recalcularlo al verificar la cadena)
+    """
+    parts = [
+        block_number.to_bytes(8, 'big'),
+        bytes.fromhex(previous_hash or ""),
+        timestamp_ns.to_bytes(8, 'big')
+    ]
+    
+    # Campos de texto con prefijo de longitud: ningún contenido puede desplazar al siguiente campo
+    for field in (action, performed_by, description, data_payload):
+        encoded = field.encode('utf-8')
+        parts.append(len(encoded).to_bytes(4, 'big'))
+        parts.append(encoded)
+    
+    return b"".join(parts)
+
+def compute_data_checksum(
+    request_json: Optional[str],
+    response_json: Optional[str],
+    error_message: Optional[str]
+) -> str:
+    """
+    Checksum SHA-256 de los datos del bloque, tal como se guardan en sus columnas
+    (el JSON nunca contiene \x00 literal, sirve de separador)
+    """
+    checksum = hashlib.sha256()
+    checksum.update(request_json.encode('utf-8') if request_json else b'')
+    checksum.update(b'\x00')
+    checksum.update(response_json.encode('utf-8') if response_json else b'')
+    checksum.update(b'\x00')
+    checksum.update((error_message or '').encode('utf-8'))
+    return checksum.hexdigest()
+
+def hash_block_input(hash_input: bytes) -> str:
+    """SHA-256 (hex) de los bytes de un bloque"""
+    return hashlib.new('sha256', hash_input, usedforsecurity=True).hexdigest()
+
+def compute_block_hash(
+    block_number: int,
+    previous_hash: str,
+    timestamp_ns: int,
+    action: str,
+    performed_by: str,
+    description: str,
+    data_payload: str
+) -> str:
+    """Calcula el hash SHA-256 de un bloque de auditoría"""
+    return hash_block_input(build_block_hash_input(
+        block_number, previous_hash, timestamp_ns, action, performed_by, description, data_payload
+    ))
+
 class AuditBlockchain:
     """
     Sistema de blockchain simplificado para auditoría inmutable
     Cada registro contiene el hash del registro anterior, creando una cadena verificable
     """
     
+    # Resultado de is_chain_valid() por URL de BD: la cadena solo crece, basta revalidar cada minuto
+    _VALIDITY_CACHE_TTL = 60  # segundos
+    _validity_cache: Dict[str, Any] = {}
+    
     def __init__(self, db: Session):
         self.db = db
         self._genesis_hash = "0000000000000000000000000000000000000000000000000000000000000000"
@@ -29,64 +128,89 @@ class AuditBlockchain:
         self,
         block_number: int,
         previous_hash: str,
-        timestamp: datetime,
+        timestamp_ns: int,
         action: str,
         performed_by: str,
         description: str,
         data_payload: str
     ) -> str:
-        """
-        Calcula el hash SHA-256 de un bloque de auditoría
-        Incluye todos los campos críticos para garantizar integridad
-        """
-        # Crear string determinístico para hash
-        block_data = {
-            "block_number": block_number,
-            "previous_hash": previous_hash,
-            "timestamp": timestamp.isoformat(),
-            "action": action,
-            "performed_by": performed_by,
-            "description": description,
-            "data_payload": data_payload,
-            "nonce": int(time.time() * 1000000)  # Microsegundos para unicidad
-        }
-        
-        # Convertir a JSON ordenado para consistencia
-        block_string = json.dumps(block_data, sort_keys=True, separators=(',', ':'))
-        
-        # Calcular SHA-256
-        return hashlib.sha256(block_string.encode('utf-8')).hexdigest()
+        """Calcula el hash SHA-256 de un bloque de auditoría (ver compute_block_hash)"""
+        return compute_block_hash(
+            block_number, previous_hash, timestamp_ns, action, performed_by, description, data_payload
+        )
     
     def get_last_block(self) -> Optional[AuditLog]:
         """Obtiene el último bloque de la cadena"""
         return self.db.query(AuditLog).order_by(desc(AuditLog.block_number)).first()
     
+    def get_head(self) -> Tuple[int, str]:
+        """
+        Obtiene (número, hash) del último bloque; (0, hash génesis) si la cadena está vacía
+        Se lee siempre de la BD (otras sesiones/procesos también agregan bloques)
+        """
+        # Solo las dos columnas necesarias: se resuelve desde idx_audit_blockchain
+        # (block_number, current_hash) sin leer la fila completa (request_data, response_data...)
+        head = self.db.execute(
+            select(AuditLog.block_number, AuditLog.current_hash)
+            .order_by(desc(AuditLog.block_number))
+            .limit(1)
+        ).first()
+        return (head.block_number, head.current_hash) if head else (0, self._genesis_hash)
+    
     def get_next_block_number(self) -> int:
         """Obtiene el siguiente número de bloque"""
-        last_block = self.get_last_block()
-        return (last_block.block_number + 1) if last_block else 1
+        return self.get_head()[0] + 1
     
     def get_previous_hash(self) -> str:
         """Obtiene el hash del bloque anterior"""
-        last_block = self.get_last_block()
-        return last_block.current_hash if last_block else self._genesis_hash
+        return self.get_head()[1]
+    
+    def is_chain_valid(self) -> bool:
+        """
+        Indica si la cadena está íntegra (se detiene en el primer bloque inválido)
+        El resultado se cachea _VALIDITY_CACHE_TTL segundos
+        """
+        cache_key = str(self.db.get_bind().url)
+        cached = self._validity_cache.get(cache_key)
+        if cached and time.monotonic() - cached["timestamp"] < self._VALIDITY_CACHE_TTL:
+            return cached["is_valid"]
+        
+        is_valid = self.verify_chain_integrity(early_exit=True, incremental=True)["is_valid"]
+        self._validity_cache[cache_key] = {"is_valid": is_valid, "timestamp": time.monotonic()}
+        return is_valid
     
-    def verify_chain_integrity(self, limit: Optional[int] = None) -> Dict[str, Any]:
+    def verify_chain_integrity(
+        self,
+        limit: Optional[int] = None,
+        early_exit: bool = False,
+        incremental: bool = False
+    ) -> Dict[str, Any]:
         """
         Verifica la integridad de la cadena de bloques
         Retorna reporte detallado de verificación
+        Con early_exit=True se detiene en el primer bloque inválido (los conteos quedan parciales)
+        Con incremental=True solo recorre los bloques posteriores al último checkpoint verificado
         """
         start_time = time.time()
         
-        query = self.db.query(AuditLog).order_by(AuditLog.block_number)
+        # La cadena es append-only: desde el checkpoint basta con verificar el sufijo nuevo
+        # populate_existing: el checkpoint se escribe desde otra sesión, no confiar en el identity map
+        checkpoint = self.db.get(BlockchainCheckpoint, CHECKPOINT_ID, populate_existing=True)
+        start_block_number = checkpoint.block_number if (incremental and checkpoint) else 0
+        
+        # Los registros fallback (block_number 0) quedan fuera de la cadena, igual que en idx_audit_block_unique
+        stmt = select(AuditLog).where(AuditLog.block_number > start_block_number).order_by(AuditLog.block_number)
         if limit:
-            query = query.limit(limit)
+            stmt = stmt.limit(limit)
         
-        blocks = query.all()
+        # Streaming por lotes (cursor de servidor en PostgreSQL) en lugar de materializar toda la tabla
+        blocks = self.db.execute(
+            stmt.execution_options(stream_results=True, yield_per=VERIFY_BATCH_SIZE)
+        ).scalars()
         
         verification_result = {
             "is_valid": True,
-            "total_blocks": len(blocks),
+            "total_blocks": 0,
             "verified_blocks": 0,
             "invalid_blocks": [],
             "missing_blocks": [],
@@ -95,58 +219,74 @@ class AuditBlockchain:
             "last_verified_block": None
         }
         
-        expected_previous_hash = self._genesis_hash
-        expected_block_number = 1
+        missing_blocks = verification_result["missing_blocks"]
+        hash_mismatches = verification_result["hash_mismatches"]
+        invalid_blocks = verification_result["invalid_blocks"]
+        total_blocks = 0
+        invalid_count = 0
+        
+        if start_block_number:
+            expected_previous_hash = checkpoint.chain_hash
+            expected_block_number = start_block_number + 1
+        else:
+            expected_previous_hash = self._genesis_hash
+            expected_block_number = 1
         
         for block in blocks:
+            total_blocks += 1
+            
             # Verificar número de bloque secuencial
             if block.block_number != expected_block_number:
-                verification_result["missing_blocks"].append({
-                    "expected": expected_block_number,
-                    "found": block.block_number,
-                    "block_id": block.id
-                })
+                if len(missing_blocks) < MAX_REPORTED_ISSUES:
+                    missing_blocks.append({
+                        "expected": expected_block_number,
+                        "found": block.block_number,
+                        "block_id": block.id
+                    })
                 verification_result["is_valid"] = False
             
             # Verificar hash del bloque anterior
             if block.previous_hash != expected_previous_hash:
-                verification_result["hash_mismatches"].append({
-                    "block_id": block.id,
-                    "block_number": block.block_number,
-                    "expected_previous_hash": expected_previous_hash,
-                    "actual_previous_hash": block.previous_hash
-                })
+                if len(hash_mismatches) < MAX_REPORTED_ISSUES:
+                    hash_mismatches.append({
+                        "block_id": block.id,
+                        "block_number": block.block_number,
+                        "expected_previous_hash": expected_previous_hash,
+                        "actual_previous_hash": block.previous_hash
+                    })
                 verification_result["is_valid"] = False
             
-            # Recalcular hash del bloque actual
-            data_payload = self._create_data_payload(block)
-            calculated_hash = self.calculate_block_hash(
-                block.block_number,
-                block.previous_hash,
-                block.timestamp,
-                block.action,
-                block.performed_by,
-                block.description,
-                data_payload
-            )
-            
-            # Verificar hash actual
+            # Recalcular el hash del bloque desde sus columnas
+            calculated_hash = hash_block_input(self.get_hash_input(block))
             if block.current_hash != calculated_hash:
-                verification_result["invalid_blocks"].append({
-                    "block_id": block.id,
-                    "block_number": block.block_number,
-                    "stored_hash": block.current_hash,
-                    "calculated_hash": calculated_hash,
-                    "timestamp": block.timestamp.isoformat()
-                })
+                invalid_count += 1
+                if len(invalid_blocks) < MAX_REPORTED_ISSUES:
+                    invalid_blocks.append({
+                        "block_id": block.id,
+                        "block_number": block.block_number,
+                        "stored_hash": block.current_hash,
+                        "calculated_hash": calculated_hash,
+                        "timestamp": block.timestamp.isoformat()
+                    })
                 verification_result["is_valid"] = False
-            else:
-                verification_result["verified_blocks"] += 1
             
             # Preparar para siguiente iteración
             expected_previous_hash = block.current_hash
             expected_block_number = block.block_number + 1
             verification_result["last_verified_block"] = block.block_number
+            
+            if early_exit and not verification_result["is_valid"]:
+                break
+        
+        verification_result["total_blocks"] = total_blocks
+        verification_result["verified_blocks"] = total_blocks - invalid_count
+        
+        if verification_result["is_valid"]:
+            if total_blocks:
+                self._save_checkpoint(verification_result["last_verified_block"], expected_previous_hash)
+        elif checkpoint and not start_block_number:
+            # Una verificación completa falló: las incrementales deben volver a partir del génesis
+            self._clear_checkpoint()
         
         verification_result["verification_time"] = time.time() - start_time
         
@@ -154,12 +294,62 @@ class AuditBlockchain:
         if verification_result["is_valid"]:
             logger.info(f"Blockchain verification PASSED: {verification_result['verified_blocks']} blocks verified")
         else:
-            logger.error(f"Blockchain verification FAILED: {len(verification_result['invalid_blocks'])} invalid blocks found")
+            logger.error(f"Blockchain verification FAILED: {invalid_count} invalid blocks found")
         
         return verification_result
     
+    def _save_checkpoint(self, block_number: int, chain_hash: str):
+        """
+        Registra el último bloque verificado como punto de partida de la próxima verificación incremental
+        Se escribe en una sesión propia y corta: la verificación es de solo lectura y no debe
+        confirmar (ni revertir) lo que la sesión del llamador tenga pendiente
+        """
+        try:
+            with Session(bind=self.db.get_bind()) as checkpoint_db, checkpoint_db.begin():
+                checkpoint = checkpoint_db.get(BlockchainCheckpoint, CHECKPOINT_ID)
+                if checkpoint is None:
+                    checkpoint = BlockchainCheckpoint(id=CHECKPOINT_ID)
+                    checkpoint_db.add(checkpoint)
+                elif checkpoint.block_number >= block_number:
+                    return
+                
+                checkpoint.block_number = block_number
+                checkpoint.chain_hash = chain_hash
+                checkpoint.verified_at = datetime.utcnow()
+        except Exception as e:
+            logger.warning(f"Could not save blockchain checkpoint: {str(e)}")
+    
+    def _clear_checkpoint(self):
+        """Elimina el checkpoint tras detectar corrupción en una verificación completa (sesión propia)"""
+        try:
+            with Session(bind=self.db.get_bind()) as checkpoint_db, checkpoint_db.begin():
+                checkpoint_db.execute(
+                    delete(BlockchainCheckpoint).where(BlockchainCheckpoint.id == CHECKPOINT_ID)
+                )
+        except Exception as e:
+            logger.warning(f"Could not clear blockchain checkpoint: {str(e)}")
+    
+    def get_hash_input(self, audit_log: AuditLog) -> bytes:
+        """
+        Bytes hasheados de un bloque, reconstruidos siempre desde sus columnas: cualquier
+        cambio en la fila (descripción, usuario, datos, timestamp) cambia el hash recalculado
+        """
+        return build_block_hash_input(
+            audit_log.block_number,
+            audit_log.previous_hash,
+            audit_log.timestamp_ns if audit_log.timestamp_ns is not None else datetime_to_ns(audit_log.timestamp),
+            audit_log.action,
+            audit_log.performed_by,
+            audit_log.description,
+            self._create_data_payload(audit_log)
+        )
+    
     def _create_data_payload(self, audit_log: AuditLog) -> str:
-        """Crea payload de datos para hash (sin datos sensibles)"""
+        """
+        Crea payload de datos para hash (sin datos sensibles)
+        El checksum se recalcula desde request_data/response_data/error_message, no se lee
+        de la fila: así una edición de esas columnas también invalida el bloque
+        """
         payload = {
             "payment_id": audit_log.payment_id,
             "session_id": audit_log.session_id,
@@ -167,7 +357,9 @@ class AuditBlockchain:
             "ip_address": audit_log.ip_address,
             "user_agent": audit_log.user_agent[:100] if audit_log.user_agent else None,  # Truncar para consistencia
             "error_message": audit_log.error_message[:200] if audit_log.error_message else None,
-            "data_checksum": audit_log.data_checksum
+            "data_checksum": compute_data_checksum(
+                audit_log.request_data, audit_log.response_data, audit_log.error_message
+            )
         }
         
         return json.dumps(payload, sort_keys=True, separators=(',', ':'))
@@ -178,13 +370,20 @@ class BlockchainAuditLogger:
     Garantiza que los logs no puedan ser alterados sin detección
     """
     
+    # Cache de estadísticas por URL de BD (count(*) sobre audit_logs es costoso y el
+    # dashboard lo consulta en cada refresco); se invalida al registrar nuevos bloques
+    _STATS_CACHE_TTL = 10  # segundos
+    _stats_cache: Dict[str, Any] = {}
+    
     def __init__(self, db: Session):
         self.db = db
         self.blockchain = AuditBlockchain(db)
+        # Un solo masker por logger: sus patrones se compilan una vez, no en cada log
+        self._masker = DataMasker()
     
     def log_action(
         self,
-        action: AuditAction,
+        action: Union[AuditAction, str],
         description: str,
         performed_by: str,
         payment_id: Optional[int] = None,
@@ -194,100 +393,173 @@ class BlockchainAuditLogger:
         ip_address: Optional[str] = None,
         user_agent: Optional[str] = None,
         correlation_id: Optional[str] = None,
-        session_id: Optional[str] = None
+        session_id: Optional[str] = None,
+        blockchain_enabled: bool = False
     ) -> AuditLog:
         """
         Registra una acción en el blockchain de auditoría
         Aplica automáticamente filtrado de datos sensibles
+        action puede ser un AuditAction o el nombre de una acción personalizada
+        """
+        return self.log_actions_batch([{
+            "action": action,
+            "description": description,
+            "performed_by": performed_by,
+            "payment_id": payment_id,
+            "request_data": request_data,
+            "response_data": response_data,
+            "error_message": error_message,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "correlation_id": correlation_id,
+            "session_id": session_id,
+            "blockchain_enabled": blockchain_enabled
+        }])[0]
+    
+    def log_actions_batch(self, events: List[Dict[str, Any]]) -> List[AuditLog]:
         """
+        Registra varias acciones encadenadas en una sola transacción (un commit para todo el lote)
+        Cada evento es un dict con los mismos argumentos que log_action
+        
+        Lo pendiente en la sesión del llamador se confirma con el lote; los bloques se insertan
+        en un SAVEPOINT, de modo que un reintento por conflicto de cabeza solo descarta los bloques
+        """
+        if not events:
+            return []
+        
         try:
-            from .data_masking import DataMasker
-            
-            # Filtrar datos sensibles
-            masker = DataMasker()
-            filtered_request = masker.mask_sensitive_data(request_data) if request_data else None
-            filtered_response = masker.mask_sensitive_data(response_data) if response_data else None
-            
-            # Calcular checksum de datos
-            data_for_checksum = {
-                "request": filtered_request,
-                "response": filtered_response,
-                "error": error_message
-            }
-            data_checksum = hashlib.sha256(
-                json.dumps(data_for_checksum, sort_keys=True, default=str).encode('utf-8')
-            ).hexdigest()
-            
-            # Obtener información del blockchain
-            block_number = self.blockchain.get_next_block_number()
-            previous_hash = self.blockchain.get_previous_hash()
-            timestamp = datetime.utcnow()
+            # Cambios pendientes del llamador primero: un error suyo no se confunde con un conflicto
+            self.db.flush()
             
-            # Crear payload para hash
-            data_payload = json.dumps({
-                "payment_id": payment_id,
-                "session_id": session_id,
-                "correlation_id": correlation_id,
-                "ip_address": ip_address,
-                "user_agent": user_agent[:100] if user_agent else None,
-                "error_message": error_message[:200] if error_message else None,
-                "data_checksum": data_checksum
-            }, sort_keys=True, separators=(',', ':'))
+            for attempt in range(1, HEAD_CONFLICT_RETRIES + 1):
+                # La cabeza se lee dentro de la misma transacción que inserta el lote (una lectura
+                # por lote); si otro proceso insertó antes el mismo block_number, el índice único
+                # rechaza el lote en lugar de bifurcar la cadena y se reintenta sobre la nueva cabeza
+                head_block_number, previous_hash = self.blockchain.get_head()
+                
+                audit_logs = []
+                logged_blocks = []
+                for block_number, event in enumerate(events, start=head_block_number + 1):
+                    audit_log = self._build_block(block_number, previous_hash, **event)
+                    audit_logs.append(audit_log)
+                    logged_blocks.append((block_number, audit_log.action, audit_log.correlation_id, audit_log.current_hash, previous_hash))
+                    previous_hash = audit_log.current_hash
+                
+                try:
+                    with self.db.begin_nested():
+                        self.db.add_all(audit_logs)
+                except IntegrityError as e:
+                    if not is_head_conflict(e) or attempt == HEAD_CONFLICT_RETRIES:
+                        raise
+                    logger.warning(f"Blockchain head moved while logging (block {head_block_number + 1} taken), retrying")
+                    continue
+                
+                self.db.commit()
+                break
             
-            # Calcular hash del bloque actual
-            current_hash = self.blockchain.calculate_block_hash(
-                block_number=block_number,
-                previous_hash=previous_hash,
-                timestamp=timestamp,
-                action=action.value,
-                performed_by=performed_by,
-                description=description,
-                data_payload=data_payload
-            )
-            
-            # Crear registro de auditoría
-            audit_log = AuditLog(
-                payment_id=payment_id,
-                action=action.value,
-                description=description,
-                performed_by=performed_by,
-                user_agent=user_agent,
-                ip_address=ip_address,
-                request_data=json.dumps(filtered_request) if filtered_request else None,
-                response_data=json.dumps(filtered_response) if filtered_response else None,
-                error_message=error_message,
-                timestamp=timestamp,
-                session_id=session_id,
-                correlation_id=correlation_id,
-                previous_hash=previous_hash,
-                current_hash=current_hash,
-                block_number=block_number,
-                data_checksum=data_checksum,
-                is_verified=True,
-                verification_timestamp=timestamp
-            )
+            BlockchainAuditLogger._stats_cache.pop(str(self.db.get_bind().url), None)
             
-            self.db.add(audit_log)
-            self.db.commit()
+            for block_number, action, correlation_id, current_hash, block_previous_hash in logged_blocks:
+                logger.info(
+                    f"Blockchain audit logged",
+                    extra={
+                        'block_number': block_number,
+                        'action': action,
+                        'correlation_id': correlation_id,
+                        'current_hash': current_hash[:8],
+                        'previous_hash': block_previous_hash[:8]
+                    }
+                )
             
-            logger.info(
-                f"Blockchain audit logged",
-                extra={
-                    'block_number': block_number,
-                    'action': action.value,
-                    'correlation_id': correlation_id,
-                    'current_hash': current_hash[:8],
-                    'previous_hash': previous_hash[:8]
-                }
-            )
-            
-            return audit_log
+            return audit_logs
             
         except Exception as e:
             self.db.rollback()
             logger.error(f"Failed to log blockchain audit: {str(e)}")
             raise
     
+    def _build_block(
+        self,
+        block_number: int,
+        previous_hash: str,
+        action: Union[AuditAction, str],
+        description: str,
+        performed_by: str,
+        payment_id: Optional[int] = None,
+        request_data: Optional[Dict] = None,
+        response_data: Optional[Dict] = None,
+        error_message: Optional[str] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        blockchain_enabled: bool = False
+    ) -> AuditLog:
+        """Construye (sin persistir) el bloque de auditoría encadenado a previous_hash"""
+        action_value = action.value if isinstance(action, AuditAction) else action
+        
+        # Filtrar datos sensibles
+        masker = self._masker
+        filtered_request = masker.mask_sensitive_data(request_data) if request_data else None
+        filtered_response = masker.mask_sensitive_data(response_data) if response_data else None
+        
+        # Serializar una sola vez: el mismo JSON se guarda en la BD y alimenta el checksum
+        request_json = json.dumps(filtered_request, sort_keys=True, default=str) if filtered_request else None
+        response_json = json.dumps(filtered_response, sort_keys=True, default=str) if filtered_response else None
+        
+        # Calcular checksum de datos
+        data_checksum = compute_data_checksum(request_json, response_json, error_message)
+        
+        # El hash usa el entero en nanosegundos; timestamp queda como columna legible
+        timestamp_ns = time.time_ns()
+        timestamp = EPOCH + timedelta(microseconds=timestamp_ns // 1000)
+        
+        # Crear payload para hash
+        data_payload = json.dumps({
+            "payment_id": payment_id,
+            "session_id": session_id,
+            "correlation_id": correlation_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent[:100] if user_agent else None,
+            "error_message": error_message[:200] if error_message else None,
+            "data_checksum": data_checksum
+        }, sort_keys=True, separators=(',', ':'))
+        
+        # Calcular hash del bloque actual
+        current_hash = compute_block_hash(
+            block_number=block_number,
+            previous_hash=previous_hash,
+            timestamp_ns=timestamp_ns,
+            action=action_value,
+            performed_by=performed_by,
+            description=description,
+            data_payload=data_payload
+        )
+        
+        # Crear registro de auditoría
+        return AuditLog(
+            payment_id=payment_id,
+            action=action_value,
+            description=description,
+            performed_by=performed_by,
+            user_agent=user_agent,
+            ip_address=ip_address,
+            request_data=request_json,
+            response_data=response_json,
+            error_message=error_message,
+            timestamp=timestamp,
+            timestamp_ns=timestamp_ns,
+            session_id=session_id,
+            correlation_id=correlation_id,
+            previous_hash=previous_hash,
+            current_hash=current_hash,
+            block_number=block_number,
+            data_checksum=data_checksum,
+            is_verified=True,
+            verification_timestamp=timestamp,
+            blockchain_enabled=blockchain_enabled
+        )
+    
     def verify_log_integrity(self, audit_log_id: int) -> Dict[str, Any]:
         """Verifica la integridad de un log específico"""
         audit_log = self.db.query(AuditLog).filter(AuditLog.id == audit_log_id).first()
@@ -296,16 +568,7 @@ class BlockchainAuditLogger:
             return {"is_valid": False, "error": "Audit log not found"}
         
         # Recalcular hash
-        data_payload = self.blockchain._create_data_payload(audit_log)
-        calculated_hash = self.blockchain.calculate_block_hash(
-            audit_log.block_number,
-            audit_log.previous_hash,
-            audit_log.timestamp,
-            audit_log.action,
-            audit_log.performed_by,
-            audit_log.description,
-            data_payload
-        )
+        calculated_hash = hash_block_input(self.blockchain.get_hash_input(audit_log))
         
         is_valid = audit_log.current_hash == calculated_hash
         
@@ -320,12 +583,23 @@ class BlockchainAuditLogger:
     
     def get_blockchain_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas del blockchain de auditoría"""
+        cache_key = str(self.db.get_bind().url)
+        cached = self._stats_cache.get(cache_key)
+        if cached and time.monotonic() - cached["timestamp"] < self._STATS_CACHE_TTL:
+            return dict(cached["data"])
+        
+        stats = self._compute_blockchain_stats()
+        self._stats_cache[cache_key] = {"data": stats, "timestamp": time.monotonic()}
+        return dict(stats)
+    
+    def _compute_blockchain_stats(self) -> Dict[str, Any]:
+        """Calcula las estadísticas del blockchain contra la BD (sin cache)"""
         total_blocks = self.db.query(func.count(AuditLog.id)).scalar()
         
         if total_blocks == 0:
             return {
                 "total_blocks": 0,
-                "genesis_hash": self._genesis_hash,
+                "genesis_hash": self.blockchain._genesis_hash,
                 "last_block": None,
                 "chain_length": 0
             }
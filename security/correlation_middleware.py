@@ -2,16 +2,54 @@
 Correlation ID Middleware - Global Request Tracking
 Implements X-Correlation-ID propagation for distributed tracing
 """
-import uuid
+import os
 import time
 from contextvars import ContextVar
 from typing import Optional, Callable
 from fastapi import Request, Response
-from fastapi.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
 import logging
 
 logger = logging.getLogger("correlation_middleware")
 
 # Context variable para almacenar correlation ID en el contexto de la request
 _correlation_id: ContextVar[Optional[str]] = ContextVar('correlation_id', default=None)
-_request_start_time: ContextVar[Optional[float]] = ContextVar('requ
\ No newline at end of file
+_request_start_time: ContextVar[Optional[float]] = ContextVar('request_start_time', default=None)
+
+CORRELATION_HEADER = "X-Correlation-ID"
+
+class CorrelationMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware que asigna un correlation ID a cada request y lo propaga en la respuesta
+    Reutiliza el X-Correlation-ID entrante si el cliente lo envía
+    """
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        # 128 bits aleatorios en hex: una llamada al sistema, sin el wrapper de uuid.uuid4()
+        correlation_id = request.headers.get(CORRELATION_HEADER) or os.urandom(16).hex()
+
+        # request.state es el camino rápido dentro del manejo de la request;
+        # el ContextVar queda para código sin acceso a la request (tareas en background)
+        request.state.correlation_id = correlation_id
+        correlation_token = _correlation_id.set(correlation_id)
+        start_token = _request_start_time.set(time.time())
+
+        try:
+            response = await call_next(request)
+            response.headers[CORRELATION_HEADER] = correlation_id
+            return response
+        finally:
+            _correlation_id.reset(correlation_token)
+            _request_start_time.reset(start_token)
+
+def get_correlation_id(request: Optional[Request] = None) -> Optional[str]:
+    """
+    Obtiene el correlation ID de la request actual
+    Con la request disponible se lee de request.state (acceso directo a atributo);
+    sin ella se recurre al ContextVar
+    """
+    if request is not None:
+        correlation_id = getattr(request.state, "correlation_id", None)
+        if correlation_id is not None:
+            return correlation_id
+    return _correlation_id.get()
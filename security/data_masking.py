@@ -4,12 +4,105 @@ Implements automatic filtering of sensitive data from logs and responses
 """
 import re
 import json
+import string
 from typing import Any, Dict, List, Optional, Union
-from functools import wraps
+from functools import wraps, lru_cache
+from urllib.parse import quote_plus, unquote_plus
 import logging
 
+# orjson es opcional: parseo y serialización más rápidos en mask_json_string, con fallback a json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# google-re2 es opcional: motor de tiempo lineal para los patrones de valores, que se
+# aplican a datos externos (webhooks); con fallback a re
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
 logger = logging.getLogger("data_masking")
 
+# Valores más cortos nunca se consideran sensibles por su formato
+VALUE_MIN_LENGTH = 8
+
+# Enteros con menos de VALUE_MIN_LENGTH caracteres como texto (el signo cuenta)
+_SHORT_INT_MIN = -10 ** (VALUE_MIN_LENGTH - 2)
+_SHORT_INT_MAX = 10 ** (VALUE_MIN_LENGTH - 1)
+
+MAX_DEPTH_MARKER = "[MAX_DEPTH_REACHED]"
+
+# Tipos exactos de contenedor/texto: una búsqueda en dict en lugar de la cadena de isinstance
+# (_container_kind cubre las subclases, p. ej. OrderedDict)
+_CONTAINER_KINDS = {dict: dict, list: list, tuple: tuple, str: str}
+
+def _container_kind(value: Any) -> Optional[type]:
+    """dict, list, tuple o str para subclases de esos tipos; None para el resto"""
+    for base in _CONTAINER_KINDS:
+        if isinstance(value, base):
+            return base
+    return None
+
+# Escalares que nunca se enmascaran (la mayoría de las hojas en payloads de pagos):
+# se devuelven antes de consultar los tipos de contenedor y el fallback con isinstance
+_SCALAR_TYPES = frozenset({int, float, bool, type(None)})
+
+# Tokens y base64: una corrida de al menos TOKEN_MIN_LENGTH caracteres de este alfabeto.
+# Se detecta con un recorrido lineal en lugar de las regex con \b y cuantificador abierto
+TOKEN_CHARS = frozenset(string.ascii_letters + string.digits + "+/")
+TOKEN_MIN_LENGTH = 20
+
+def _has_token_run(value: str) -> bool:
+    """True si el valor contiene TOKEN_MIN_LENGTH caracteres seguidos del alfabeto de tokens"""
+    if len(value) < TOKEN_MIN_LENGTH:
+        return False
+    
+    run = 0
+    for char in value:
+        if char in TOKEN_CHARS:
+            run += 1
+            if run >= TOKEN_MIN_LENGTH:
+                return True
+        else:
+            run = 0
+    return False
+
+@lru_cache(maxsize=16)
+def _compile_value_pattern(pattern: str):
+    """Compila la alternación de valores con re2 si está disponible; si no (o si re2 no la soporta), con re"""
+    if RE2_AVAILABLE:
+        try:
+            return re2.compile(pattern)
+        except re2.error as e:
+            logger.warning(f"re2 cannot compile value patterns, falling back to re: {e}")
+    return re.compile(pattern)
+
+# Cache de resultados por nombre de campo, indexada por el texto del patrón (str con hash ya
+# calculado; hashear el objeto Pattern recorre su bytecode en cada llamada). En un fallo,
+# re.search resuelve el patrón compilado desde la cache interna de re.
+# Los valores no se cachean: guardaría PANs, tokens y emails en memoria durante todo el proceso
+@lru_cache(maxsize=4096)
+def _is_sensitive_field_cached(field_name: str, pattern: str) -> bool:
+    """Resultado de la regex de campos por nombre: el vocabulario de claves es pequeño y se repite"""
+    return re.search(pattern, field_name, re.IGNORECASE) is not None
+
+# 19 dígitos seguidos pueden ser un entero fuera del rango de 64 bits, que orjson convierte
+# a float; esos payloads (y los que orjson rechaza, como NaN/Infinity) van por json
+_LONG_DIGIT_RUN = re.compile(r'\d{19}')
+
+def _loads_json(json_string: str) -> tuple:
+    """Parsea JSON con orjson si puede hacerlo sin pérdida; retorna (datos, si se usó orjson)"""
+    if ORJSON_AVAILABLE and not _LONG_DIGIT_RUN.search(json_string):
+        try:
+            return orjson.loads(json_string), True
+        except orjson.JSONDecodeError:
+            pass  # Extensiones que solo acepta json (NaN, Infinity): reintentar con json
+    return json.loads(json_string), False
+
 class DataMasker:
     """
     Clase para enmascaramiento automático de datos sensibles
@@ -73,11 +166,10 @@ class DataMasker:
     }
     
     # Patrones de valores que parecen sensibles (por formato)
+    # Strings largos alfanuméricos y base64 se detectan con _has_token_run
     VALUE_PATTERNS = {
         'credit_card': re.compile(r'\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b'),
-        'token_like': re.compile(r'\b[A-Za-z0-9]{32,}\b'),  # Strings largos alfanuméricos
         'uuid': re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', re.IGNORECASE),
-        'base64': re.compile(r'\b[A-Za-z0-9+/]{20,}={0,2}\b'),  # Base64 strings
         'jwt': re.compile(r'\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\b'),  # JWT tokens
     }
     
@@ -85,45 +177,68 @@ class DataMasker:
         self.mask_char = mask_char
         self.partial_reveal = partial_reveal
         
-        # Compilar patrones de campos sensibles
-        self.compiled_patterns = {}
-        for name, pattern in self.SENSITIVE_PATTERNS.items():
-            self.compiled_patterns[name] = re.compile(pattern, re.IGNORECASE)
+        # Todos los patrones de campos en una sola alternación: una búsqueda en C por campo
+        # en lugar de un search() por patrón
+        self._field_regex = re.compile(
+            "(?:" + "|".join(self.SENSITIVE_PATTERNS.values()) + ")",
+            re.IGNORECASE
+        )
+        
+        # Nombres literales (patrón == nombre, sin metacaracteres): coincidencia exacta por hash
+        # antes de la regex. La alternación los conserva porque la búsqueda es por subcadena
+        # ("user_password" también es sensible)
+        self._exact_sensitive = frozenset(
+            name for name, pattern in self.SENSITIVE_PATTERNS.items() if pattern == name
+        )
+        
+        # Igual para los patrones de valores (cada uno conserva sus flags en un grupo local);
+        # con re2 la alternación completa corre en tiempo lineal
+        self._value_regex = _compile_value_pattern("|".join(
+            f"(?i:{pattern.pattern})" if pattern.flags & re.IGNORECASE else f"(?:{pattern.pattern})"
+            for pattern in self.VALUE_PATTERNS.values()
+        ))
+        
+        # Máscaras precalculadas por longitud (el enmascaramiento nunca usa más de 12 caracteres)
+        self._masks = tuple(mask_char * length for length in range(13))
+    
+    @staticmethod
+    def cache_clear():
+        """Vacía la cache de resultados de is_sensitive_field"""
+        _is_sensitive_field_cached.cache_clear()
     
     def is_sensitive_field(self, field_name: str) -> bool:
         """Verifica si un campo es sensible basado en su nombre"""
-        field_lower = field_name.lower()
-        
-        for pattern_name, compiled_pattern in self.compiled_patterns.items():
-            if compiled_pattern.search(field_lower):
-                return True
-        
-        return False
+        if field_name in self._exact_sensitive:
+            return True
+        return _is_sensitive_field_cached(field_name, self._field_regex.pattern)
     
     def is_sensitive_value(self, value: str) -> bool:
         """Verifica si un valor parece sensible basado en su formato"""
-        if not isinstance(value, str) or len(value) < 8:
+        if not isinstance(value, str) or len(value) < VALUE_MIN_LENGTH:
             return False
         
-        for pattern_name, pattern in self.VALUE_PATTERNS.items():
-            if pattern.search(value):
-                return True
-        
-        return False
+        return _has_token_run(value) or self._value_regex.search(value) is not None
     
     def mask_value(self, value: Any, field_name: str = "") -> Any:
         """Enmascara un valor si es sensible"""
         if value is None:
             return None
         
-        # Convertir a string para análisis
-        str_value = str(value)
-        
-        # Verificar si el campo o valor es sensible
+        # Verificar si el campo es sensible
         is_field_sensitive = self.is_sensitive_field(field_name) if field_name else False
-        is_value_sensitive = self.is_sensitive_value(str_value)
         
-        if is_field_sensitive or is_value_sensitive:
+        # Convertir a string para análisis, salvo que el texto sea demasiado corto para
+        # parecer sensible (booleanos y enteros pequeños, frecuentes en los logs)
+        if isinstance(value, str):
+            str_value = value
+        elif not is_field_sensitive and (
+            type(value) is bool or (type(value) is int and _SHORT_INT_MIN < value < _SHORT_INT_MAX)
+        ):
+            return value
+        else:
+            str_value = str(value)
+        
+        if is_field_sensitive or self.is_sensitive_value(str_value):
             return self._apply_masking(str_value, field_name)
         
         return value
@@ -132,13 +247,13 @@ class DataMasker:
         """Aplica enmascaramiento a un valor sensible"""
         if len(value) <= self.partial_reveal * 2:
             # Si el valor es muy corto, enmascarar completamente
-            return self.mask_char * min(len(value), 8)
+            return self._masks[min(len(value), 8)]
         
         # Enmascaramiento parcial: mostrar primeros y últimos caracteres
         start = value[:self.partial_reveal]
         end = value[-self.partial_reveal:]
         middle_length = len(value) - (self.partial_reveal * 2)
-        middle = self.mask_char * min(middle_length, 12)  # Limitar longitud del mask
+        middle = self._masks[min(middle_length, 12)]  # Limitar longitud del mask
         
         return f"{start}{middle}{end}"
     
@@ -146,65 +261,158 @@ class DataMasker:
         """
         Enmascara datos sensibles en estructuras complejas (dict, list, etc.)
         Implementa protección contra recursión infinita
+        Recorrido iterativo con pila explícita: sin un frame de Python por nivel ni límite de recursión
+        Las partes sin datos sensibles se comparten con la entrada (no se copian); la entrada nunca se modifica
+        """
+        return self._mask_tracking_changes(data, max_depth)[0]
+    
+    def _mask_tracking_changes(self, data: Any, max_depth: int = 10) -> tuple:
+        """
+        Igual que mask_sensitive_data, pero retorna (datos enmascarados, si se enmascaró algo)
+        Los contenedores sin nada que enmascarar se devuelven tal cual (misma referencia):
+        solo se copian los que cambian y sus ancestros
         """
         if max_depth <= 0:
-            return "[MAX_DEPTH_REACHED]"
+            return MAX_DEPTH_MARKER, True
         
-        if isinstance(data, dict):
-            masked_dict = {}
-            for key, value in data.items():
-                if self.is_sensitive_field(key):
-                    masked_dict[key] = self.mask_value(value, key)
-                else:
-                    masked_dict[key] = self.mask_sensitive_data(value, max_depth - 1)
-            return masked_dict
+        data_type = type(data)
+        if data_type in _SCALAR_TYPES:
+            return data, False
         
-        elif isinstance(data, list):
-            return [self.mask_sensitive_data(item, max_depth - 1) for item in data]
-        
-        elif isinstance(data, tuple):
-            return tuple(self.mask_sensitive_data(item, max_depth - 1) for item in data)
-        
-        elif isinstance(data, str):
+        kind = _CONTAINER_KINDS.get(data_type) or _container_kind(data)
+        if kind is str:
             # Verificar si el string completo parece sensible
             if self.is_sensitive_value(data):
-                return self.mask_value(data)
-            return data
+                return self._apply_masking(data), True
+            return data, False
+        if kind is None:
+            # Para otros tipos, retornar sin cambios
+            return data, False
         
-        else:
-            # Para otros tipos (int, float, bool, etc.), retornar sin cambios
-            return data
+        # Cada nodo: [contenedor original, tipo, nodo padre, posición en el padre,
+        # profundidad restante, reemplazos {posición: valor} o None si no cambió nada]
+        root = [data, kind, None, None, max_depth, None]
+        nodes = [root]
+        stack = [root]
+        
+        # Referencias locales: el bucle corre una vez por elemento
+        pop = stack.pop
+        push = stack.append
+        add_node = nodes.append
+        is_sensitive_field = self.is_sensitive_field
+        is_sensitive_value = self.is_sensitive_value
+        apply_masking = self._apply_masking
+        kinds_get = _CONTAINER_KINDS.get
+        scalar_types = _SCALAR_TYPES
+        
+        while stack:
+            node = pop()
+            value, kind, _, _, depth, _ = node
+            child_depth = depth - 1
+            is_dict = kind is dict
+            
+            for slot, item in (value.items() if is_dict else enumerate(value)):
+                if is_dict and is_sensitive_field(slot):
+                    # Campo ya verificado: enmascarar directo, sin que mask_value repita la verificación
+                    masked = None if item is None else apply_masking(
+                        item if isinstance(item, str) else str(item), slot
+                    )
+                elif child_depth <= 0:
+                    masked = MAX_DEPTH_MARKER
+                else:
+                    item_type = type(item)
+                    if item_type in scalar_types:
+                        continue
+                    
+                    item_kind = kinds_get(item_type) or _container_kind(item)
+                    if item_kind is str:
+                        if not is_sensitive_value(item):
+                            continue
+                        masked = apply_masking(item)
+                    elif item_kind is None:
+                        continue
+                    else:
+                        child = [item, item_kind, node, slot, child_depth, None]
+                        add_node(child)
+                        push(child)
+                        continue
+                
+                if node[5] is None:
+                    node[5] = {}
+                node[5][slot] = masked
+        
+        # Los hijos se registran después que sus padres: en orden inverso cada contenedor
+        # modificado se copia y se reemplaza en su padre antes de procesar el padre
+        for node in reversed(nodes):
+            value, kind, parent, slot, _, replacements = node
+            if replacements is None:
+                continue
+            
+            if kind is dict:
+                masked = dict(value)
+                masked.update(replacements)
+            else:
+                masked = list(value)
+                for index, item in replacements.items():
+                    masked[index] = item
+                if kind is tuple:
+                    masked = tuple(masked)
+            
+            if parent is None:
+                return masked, True
+            if parent[5] is None:
+                parent[5] = {}
+            parent[5][slot] = masked
+        
+        return data, False
     
     def mask_json_string(self, json_string: str) -> str:
         """Enmascara datos sensibles en un string JSON"""
         try:
-            data = json.loads(json_string)
-            masked_data = self.mask_sensitive_data(data)
+            data, parsed_with_orjson = _loads_json(json_string)
+            masked_data, changed = self._mask_tracking_changes(data)
+            if not changed:
+                # Nada que enmascarar: el string original es válido tal cual
+                return json_string
+            if parsed_with_orjson:
+                return orjson.dumps(masked_data).decode()
             return json.dumps(masked_data, separators=(',', ':'))
-        except (json.JSONDecodeError, TypeError):
+        except (ValueError, TypeError):
             # Si no es JSON válido, tratar como string normal
             return self.mask_value(json_string)
     
     def mask_url_params(self, url: str) -> str:
-        """Enmascara parámetros sensibles en URLs"""
-        if '?' not in url:
+        """
+        Enmascara parámetros sensibles en URLs
+        Solo se reescribe el valor de los parámetros sensibles; el resto de la URL se conserva byte a byte
+        """
+        # El fragmento (#...) se separa primero, igual que en urlsplit
+        before_fragment, hash_sign, fragment = url.partition('#')
+        base, question_mark, query = before_fragment.partition('?')
+        if not query:
             return url
         
-        base_url, params = url.split('?', 1)
-        param_pairs = params.split('&')
+        changed = False
+        segments = query.split('&')
+        for index, segment in enumerate(segments):
+            raw_key, equals, raw_value = segment.partition('=')
+            if not equals:
+                continue
+            
+            # Claves y valores se comparan decodificados (un "&" codificado no corta el valor)
+            key = unquote_plus(raw_key)
+            if not self.is_sensitive_field(key):
+                continue
+            
+            masked_value = self.mask_value(unquote_plus(raw_value), key)
+            # safe=mask_char mantiene legible la máscara en lugar de %2A
+            segments[index] = f"{raw_key}={quote_plus(str(masked_value), safe=self.mask_char)}"
+            changed = True
         
-        masked_pairs = []
-        for pair in param_pairs:
-            if '=' in pair:
-                key, value = pair.split('=', 1)
-                if self.is_sensitive_field(key):
-                    masked_pairs.append(f"{key}={self.mask_value(value, key)}")
-                else:
-                    masked_pairs.append(pair)
-            else:
-                masked_pairs.append(pair)
+        if not changed:
+            return url
         
-        return f"{base_url}?{'&'.join(masked_pairs)}"
+        return f"{base}{question_mark}{'&'.join(segments)}{hash_sign}{fragment}"
 
 # Instancia global del masker
 _global_masker = DataMasker()
@@ -220,10 +428,11 @@ def sensitive_data_filter(func):
             # Ejecutar función original
             result = func(*args, **kwargs)
             
-            # Si la función retorna un diccionario, enmascarar datos sensibles
-            if isinstance(result, dict):
-                # Crear copia para no modificar el resultado original
-                masked_result = _global_masker.mask_sensitive_data(result.copy())
+            # Si la función retorna un diccionario y el log de debug está activo, enmascarar
+            # datos sensibles (sin debug no hay log y el enmascaramiento sería trabajo perdido)
+            if isinstance(result, dict) and logger.isEnabledFor(logging.DEBUG):
+                # mask_sensitive_data no modifica su entrada: el resultado original queda intacto
+                masked_result = _global_masker.mask_sensitive_data(result)
                 
                 # Log con datos enmascarados
                 logger.debug(
@@ -253,6 +462,14 @@ def sensitive_data_filter(func):
     
     return wrapper
 
+# Campos estándar de LogRecord que mask_log_record no revisa. msg y args no están: un msg
+# que no es str (p. ej. un dict) solo se enmascara en el recorrido de atributos
+_STD_LOG_FIELDS = frozenset({
+    'name', 'levelno', 'levelname', 'pathname', 'filename', 'module', 'lineno', 'funcName',
+    'created', 'msecs', 'relativeCreated', 'thread', 'threadName', 'processName', 'process',
+    'getMessage', 'exc_info', 'exc_text', 'stack_info'
+})
+
 def mask_log_record(record: logging.LogRecord) -> logging.LogRecord:
     """
     Filtra datos sensibles de un LogRecord antes de escribirlo
@@ -275,7 +492,7 @@ def mask_log_record(record: logging.LogRecord) -> logging.LogRecord:
     # Enmascarar datos extra
     if hasattr(record, '__dict__'):
         for key, value in record.__dict__.items():
-            if key.startswith('_') or key in ['name', 'levelno', 'levelname', 'pathname', 'filename', 'module', 'lineno', 'funcName', 'created', 'msecs', 'relativeCreated', 'thread', 'threadName', 'processName', 'process', 'getMessage', 'exc_info', 'exc_text', 'stack_info']:
+            if key.startswith('_') or key in _STD_LOG_FIELDS:
                 continue  # Skip standard logging fields
             
             if _global_masker.is_sensitive_field(key) or isinstance(value, (dict, list)):
@@ -0,0 +1,159 @@
+"""
+Response Cache Middleware - Dashboard Polling
+Cachea en proceso, con TTL corto, las respuestas GET de los endpoints del dashboard
+que el monitoreo consulta con alta frecuencia, y responde 304 a los GET condicionales
+(If-None-Match) cuyo ETag coincide
+"""
+import os
+import time
+import json
+import hashlib
+from typing import Optional, Dict, Any, Tuple
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+import logging
+
+logger = logging.getLogger("response_cache")
+
+# Rutas cacheables: coincidencia exacta o por prefijo
+CACHEABLE_PATHS = ("/dashboard",)
+CACHEABLE_PREFIXES = ("/api/v1/dashboard/",)
+
+# Cabeceras propias de cada request/respuesta que no se reenvían desde la cache
+UNCACHED_HEADERS = frozenset({"content-length", "x-cache", "cache-control", "etag", "vary", "x-correlation-id"})
+
+# Cabeceras de credencial que forman parte de la clave (y del Vary de la respuesta)
+CREDENTIAL_HEADERS = ("authorization", "x-tenant-id", "cookie")
+
+# Estados que indican una respuesta sana (solo esas se cachean, para no fijar fallos)
+HEALTHY_STATUSES = frozenset({"success", "healthy"})
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """
+    Middleware de cache de respuestas para el dashboard
+    Solo cachea GET 200 con cuerpo sano; agrega X-Cache (HIT/MISS), ETag y Cache-Control private
+    (las respuestas dependen de la credencial: ningún proxy compartido debe reutilizarlas)
+    """
+
+    def __init__(self, app, ttl: Optional[int] = None, max_entries: int = 256):
+        super().__init__(app)
+        self.ttl = ttl if ttl is not None else int(os.getenv("HEALTH_CACHE_TTL", "30"))
+        self.max_entries = max_entries
+        self._cache: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def _is_cacheable(self, request: Request) -> bool:
+        """GET a una ruta del dashboard"""
+        if request.method != "GET":
+            return False
+        path = request.url.path
+        return path in CACHEABLE_PATHS or path.startswith(CACHEABLE_PREFIXES)
+
+    def _cache_key(self, request: Request) -> Tuple[str, str, str]:
+        """
+        Clave por ruta + query + credencial: una respuesta autenticada solo se sirve
+        a quien presente el mismo token, tenant y cookies de sesión
+        """
+        credential = "|".join(request.headers.get(name, "") for name in CREDENTIAL_HEADERS)
+        return (
+            request.url.path,
+            request.url.query,
+            hashlib.sha256(credential.encode("utf-8")).hexdigest()
+        )
+
+    @staticmethod
+    def _is_healthy(body: bytes, media_type: Optional[str]) -> bool:
+        """Las respuestas JSON deben reportar status/overall_status sano; el HTML estático siempre lo es"""
+        if not media_type or "json" not in media_type:
+            return True
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return False
+
+        if not isinstance(payload, dict) or payload.get("status") not in HEALTHY_STATUSES:
+            return False
+
+        data = payload.get("data")
+        system_health = data.get("system_health") if isinstance(data, dict) else None
+        if isinstance(system_health, dict):
+            return system_health.get("overall_status") in HEALTHY_STATUSES
+        return True
+
+    def _store(self, key: Tuple[str, str, str], entry: Dict[str, Any]):
+        """Guarda una entrada descartando la más antigua si se alcanza el límite"""
+        if key not in self._cache and len(self._cache) >= self.max_entries:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = entry
+
+    @staticmethod
+    def _etag_matches(request: Request, etag: str) -> bool:
+        """If-None-Match coincide con el ETag (lista separada por comas, "*" o validadores débiles W/)"""
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+        return "*" in candidates or etag in candidates
+    
+    def _cache_headers(self, response: Response, entry: Dict[str, Any], cache_status: str) -> Response:
+        response.headers["ETag"] = entry["etag"]
+        response.headers["X-Cache"] = cache_status
+        response.headers["Cache-Control"] = f"private, max-age={self.ttl}"
+        response.headers["Vary"] = ", ".join(CREDENTIAL_HEADERS)
+        return response
+    
+    def _build_response(self, request: Request, entry: Dict[str, Any], cache_status: str) -> Response:
+        # GET condicional con el mismo ETag: 304 sin cuerpo
+        if self._etag_matches(request, entry["etag"]):
+            return self._cache_headers(Response(status_code=304), entry, cache_status)
+        
+        response = Response(
+            content=entry["body"],
+            status_code=entry["status_code"],
+            headers=entry["headers"],
+            media_type=entry["media_type"]
+        )
+        return self._cache_headers(response, entry, cache_status)
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        if self.ttl <= 0 or not self._is_cacheable(request):
+            return await call_next(request)
+
+        key = self._cache_key(request)
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached["timestamp"] < self.ttl:
+            return self._build_response(request, cached, "HIT")
+
+        response = await call_next(request)
+        if response.status_code != 200:
+            response.headers["X-Cache"] = "MISS"
+            return response
+
+        # La respuesta llega como stream: se lee una vez para cachearla y reenviarla
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        entry = {
+            "body": body,
+            "status_code": response.status_code,
+            "headers": {
+                name: value for name, value in response.headers.items()
+                if name not in UNCACHED_HEADERS
+            },
+            "media_type": response.media_type or response.headers.get("content-type"),
+            "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            "timestamp": time.monotonic()
+        }
+
+        if self._is_healthy(body, entry["media_type"]):
+            self._store(key, entry)
+            return self._build_response(request, entry, "MISS")
+
+        self._cache.pop(key, None)
+        response = Response(
+            content=body,
+            status_code=response.status_code,
+            headers=entry["headers"],
+            media_type=entry["media_type"]
+        )
+        response.headers["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,256 @@
+"""
+Tests del blockchain de auditoría
+Verifica que la cadena detecte filas alteradas directamente en la base de datos
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, AuditLog, AuditAction, BlockchainCheckpoint, Payment
+from security.blockchain_audit import BlockchainAuditLogger, compute_block_hash
+
+def _new_session_factory():
+    """Base SQLite en memoria compartida entre sesiones del mismo engine"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _new_file_session_factory(directory: str):
+    """Base SQLite en archivo: cada sesión usa su propia conexión y transacción"""
+    engine = create_engine(f"sqlite:///{directory}/audit.db")
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _log_chain(db, count: int = 3):
+    """Registra una cadena corta de bloques y retorna los AuditLog creados"""
+    audit_logger = BlockchainAuditLogger(db)
+    return [
+        audit_logger.log_action(
+            action=AuditAction.WEBHOOK_RECEIVED,
+            description=f"Webhook {i}",
+            performed_by="System",
+            request_data={"payment_id": i, "status": "approved"},
+            correlation_id=f"corr_{i}"
+        )
+        for i in range(1, count + 1)
+    ]
+
+def _new_payment(mp_payment_id: str) -> Payment:
+    """Pago mínimo con un mp_payment_id (columna única)"""
+    return Payment(
+        mp_payment_id=mp_payment_id,
+        customer_email="cliente@example.com",
+        ghl_contact_id="contact_1",
+        expected_amount=100,
+        created_by="tests"
+    )
+
+def _tamper(db, audit_log_id: int, **values):
+    """Modifica una fila por SQL, sin pasar por el logger (como lo haría un atacante)"""
+    db.execute(update(AuditLog).where(AuditLog.id == audit_log_id).values(**values))
+    db.commit()
+    db.expire_all()
+
+def test_untampered_chain_is_valid():
+    """Una cadena recién registrada verifica completa"""
+    db = _new_session_factory()()
+    blocks = _log_chain(db)
+
+    audit_logger = BlockchainAuditLogger(db)
+    result = audit_logger.blockchain.verify_chain_integrity()
+
+    assert result["is_valid"]
+    assert result["verified_blocks"] == len(blocks)
+    assert all(audit_logger.verify_log_integrity(block.id)["is_valid"] for block in blocks)
+
+def test_block_hash_is_deterministic():
+    """El hash de un bloque no depende del momento del cálculo (sin nonce temporal)"""
+    args = (7, "ab" * 32, 1700000000123456789, "webhook_received", "System", "Webhook", "{}")
+    assert compute_block_hash(*args) == compute_block_hash(*args)
+
+def test_chain_verifies_from_fresh_session():
+    """Los hashes se recalculan igual en otra sesión (como tras reiniciar el proceso)"""
+    SessionLocal = _new_session_factory()
+    writer = SessionLocal()
+    _log_chain(writer)
+    writer.close()
+
+    reader = SessionLocal()
+    result = BlockchainAuditLogger(reader).blockchain.verify_chain_integrity()
+
+    assert result["is_valid"]
+    assert result["verified_blocks"] == 3
+
+def test_concurrent_loggers_do_not_fork_chain():
+    """Dos loggers con sesiones distintas ven los bloques del otro al agregar"""
+    SessionLocal = _new_session_factory()
+    first, second = BlockchainAuditLogger(SessionLocal()), BlockchainAuditLogger(SessionLocal())
+
+    blocks = [
+        audit_logger.log_action(
+            action=AuditAction.WEBHOOK_RECEIVED,
+            description=f"Webhook {i}",
+            performed_by="System"
+        )
+        for i, audit_logger in enumerate((first, second, first, second), start=1)
+    ]
+
+    assert [block.block_number for block in blocks] == [1, 2, 3, 4]
+    assert first.blockchain.verify_chain_integrity()["is_valid"]
+
+def test_duplicate_block_number_is_rejected():
+    """El índice único impide dos bloques con el mismo número"""
+    db = _new_session_factory()()
+    block = _log_chain(db, count=1)[0]
+
+    db.add(AuditLog(
+        action=block.action,
+        description="fork",
+        performed_by="mallory",
+        block_number=block.block_number,
+        previous_hash=block.previous_hash,
+        current_hash="00" * 32
+    ))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+def test_stale_head_is_retried():
+    """Si la cabeza leída ya fue ocupada por otro escritor, el lote se reconstruye sobre la nueva"""
+    db = _new_session_factory()()
+    _log_chain(db, count=1)
+
+    audit_logger = BlockchainAuditLogger(db)
+    real_get_head = audit_logger.blockchain.get_head
+    stale_heads = [(0, audit_logger.blockchain._genesis_hash)]
+    audit_logger.blockchain.get_head = lambda: stale_heads.pop() if stale_heads else real_get_head()
+
+    block = audit_logger.log_action(
+        action=AuditAction.WEBHOOK_RECEIVED,
+        description="Webhook 2",
+        performed_by="System"
+    )
+
+    assert block.block_number == 2
+    assert audit_logger.blockchain.verify_chain_integrity()["is_valid"]
+
+def test_head_retry_keeps_caller_pending_rows():
+    """Un reintento por conflicto de cabeza no descarta lo pendiente en la sesión del llamador"""
+    db = _new_session_factory()()
+    _log_chain(db, count=1)
+
+    audit_logger = BlockchainAuditLogger(db)
+    real_get_head = audit_logger.blockchain.get_head
+    stale_heads = [(0, audit_logger.blockchain._genesis_hash)]
+    audit_logger.blockchain.get_head = lambda: stale_heads.pop() if stale_heads else real_get_head()
+
+    db.add(_new_payment("mp_1"))
+    audit_logger.log_action(action=AuditAction.PAYMENT_LINK_GENERATED, description="Pago", performed_by="System")
+    db.rollback()
+
+    assert db.query(Payment).filter_by(mp_payment_id="mp_1").count() == 1
+
+def test_caller_integrity_error_is_not_retried():
+    """Un IntegrityError de otra restricción se propaga en lugar de reintentarse sin los datos del llamador"""
+    db = _new_session_factory()()
+    db.add(_new_payment("mp_1"))
+    db.commit()
+
+    db.add(_new_payment("mp_1"))
+    with pytest.raises(IntegrityError):
+        BlockchainAuditLogger(db).log_action(action=AuditAction.PAYMENT_LINK_GENERATED, description="Pago", performed_by="System")
+
+    assert db.query(AuditLog).count() == 0
+
+def test_checkpoint_does_not_commit_caller_session():
+    """Guardar el checkpoint no confirma lo pendiente en la sesión del llamador"""
+    with tempfile.TemporaryDirectory() as directory:
+        SessionLocal = _new_file_session_factory(directory)
+        db = SessionLocal()
+        _log_chain(db)
+
+        db.add(AuditLog(action="pending", description="pending", performed_by="caller"))
+        result = BlockchainAuditLogger(db).blockchain.verify_chain_integrity()
+        db.rollback()
+
+        other = SessionLocal()
+        assert result["is_valid"]
+        assert other.query(AuditLog).count() == 3
+        assert other.get(BlockchainCheckpoint, 1).block_number == 3
+        other.close()
+        db.close()
+
+def test_incremental_verification_restarts_after_failed_full_run():
+    """Una verificación completa fallida descarta el checkpoint para las incrementales"""
+    with tempfile.TemporaryDirectory() as directory:
+        db = _new_file_session_factory(directory)()
+        blocks = _log_chain(db)
+        blockchain = BlockchainAuditLogger(db).blockchain
+
+        assert blockchain.verify_chain_integrity()["is_valid"]
+        _tamper(db, blocks[1].id, description="TAMPERED")
+
+        assert not blockchain.verify_chain_integrity()["is_valid"]
+        assert not blockchain.verify_chain_integrity(incremental=True)["is_valid"]
+        db.close()
+
+def test_tampered_columns_fail_verification():
+    """Editar descripción y usuario de un bloque invalida el bloque y la cadena"""
+    db = _new_session_factory()()
+    blocks = _log_chain(db)
+    tampered = blocks[1]
+
+    _tamper(db, tampered.id, description="TAMPERED", performed_by="mallory")
+
+    audit_logger = BlockchainAuditLogger(db)
+    result = audit_logger.blockchain.verify_chain_integrity()
+
+    assert not result["is_valid"]
+    assert [block["block_number"] for block in result["invalid_blocks"]] == [tampered.block_number]
+    assert not audit_logger.verify_log_integrity(tampered.id)["is_valid"]
+
+def test_tampered_request_data_fails_verification():
+    """Editar los datos guardados de la request también invalida el bloque"""
+    db = _new_session_factory()()
+    blocks = _log_chain(db)
+
+    _tamper(db, blocks[0].id, request_data='{"payment_id": 1, "status": "refunded"}')
+
+    audit_logger = BlockchainAuditLogger(db)
+    assert not audit_logger.blockchain.verify_chain_integrity()["is_valid"]
+    assert not audit_logger.verify_log_integrity(blocks[0].id)["is_valid"]
+
+if __name__ == "__main__":
+    tests = [
+        test_untampered_chain_is_valid,
+        test_block_hash_is_deterministic,
+        test_chain_verifies_from_fresh_session,
+        test_concurrent_loggers_do_not_fork_chain,
+        test_duplicate_block_number_is_rejected,
+        test_stale_head_is_retried,
+        test_head_retry_keeps_caller_pending_rows,
+        test_caller_integrity_error_is_not_retried,
+        test_checkpoint_does_not_commit_caller_session,
+        test_incremental_verification_restarts_after_failed_full_run,
+        test_tampered_columns_fail_verification,
+        test_tampered_request_data_fails_verification,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    sys.exit(1 if failed else 0)
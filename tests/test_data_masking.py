@@ -0,0 +1,250 @@
+"""
+Tests del enmascaramiento de datos sensibles
+Verifica campos, valores, estructuras anidadas, URLs, JSON y el decorador de logs
+"""
+import sys
+import json
+import logging
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from security.data_masking import (
+    DataMasker, MAX_DEPTH_MARKER, TOKEN_MIN_LENGTH, VALUE_MIN_LENGTH, sensitive_data_filter
+)
+
+class _RecordCollector(logging.Handler):
+    """Handler que guarda los registros emitidos (sin depender de fixtures de pytest)"""
+
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def _call_filtered(level: int, result: dict):
+    """Ejecuta una función decorada con sensitive_data_filter con el logger en el nivel dado"""
+    masking_logger = logging.getLogger("data_masking")
+    collector = _RecordCollector()
+    previous_level = masking_logger.level
+    masking_logger.addHandler(collector)
+    masking_logger.setLevel(level)
+    try:
+        @sensitive_data_filter
+        def handler():
+            return result
+        return handler(), collector.records
+    finally:
+        masking_logger.removeHandler(collector)
+        masking_logger.setLevel(previous_level)
+
+def _nest(levels: int, leaf):
+    """Lista anidada levels veces alrededor de leaf"""
+    data = leaf
+    for _ in range(levels):
+        data = [data]
+    return data
+
+def test_every_sensitive_key_class_is_detected():
+    """Cada patrón de campo sensible se detecta, también en mayúsculas, con separadores y como subcadena"""
+    masker = DataMasker()
+    for name in DataMasker.SENSITIVE_PATTERNS:
+        variants = (name, name.upper(), name.replace("_", "-"), f"user_{name}_value")
+        for variant in variants:
+            assert masker.is_sensitive_field(variant), variant
+        assert masker.mask_sensitive_data({name: "valor-secreto-123"})[name] != "valor-secreto-123", name
+
+def test_regular_fields_are_not_masked():
+    """Campos habituales de un pago no se consideran sensibles"""
+    masker = DataMasker()
+    payment = {"amount": 100.5, "status": "approved", "currency": "ARS", "payment_id": 123, "customer_name": "Ana"}
+
+    assert not any(masker.is_sensitive_field(name) for name in payment)
+    assert masker.mask_sensitive_data(payment) is payment
+
+def test_sensitive_field_masking_format():
+    """Valores largos revelan inicio y fin; los cortos se enmascaran completos"""
+    masker = DataMasker()
+
+    assert masker.mask_value("abcdefghijklmnopqrstuvwxyz", "password") == "abcd" + "*" * 12 + "wxyz"
+    assert masker.mask_value("abcdefghijkl", "password") == "abcd****ijkl"
+    assert masker.mask_value("secret1", "password") == "*******"
+    assert masker.mask_value(1234, "pin") == "****"
+    assert masker.mask_value(None, "password") is None
+
+def test_token_values_at_length_threshold():
+    """Una corrida de caracteres de token/base64 es sensible desde TOKEN_MIN_LENGTH"""
+    masker = DataMasker()
+
+    assert not masker.is_sensitive_value("a" * (TOKEN_MIN_LENGTH - 1))
+    assert masker.is_sensitive_value("a" * TOKEN_MIN_LENGTH)
+    # base64 con "+" y "/" cuenta como una sola corrida; el padding "=" la corta
+    assert masker.is_sensitive_value("QUJD+EVGR0hJ/ktMTU5P")
+    assert not masker.is_sensitive_value("QUJDREVGR0hJSktMTU4=")
+    # Dos corridas cortas separadas no suman
+    half = "x" * (TOKEN_MIN_LENGTH // 2)
+    assert not masker.is_sensitive_value(f"{half}-{half}")
+    assert masker.is_sensitive_value(f"prefijo {'Z' * TOKEN_MIN_LENGTH} sufijo")
+
+def test_formatted_values_are_detected():
+    """Tarjetas, UUIDs y JWTs se detectan por formato; lo corto nunca"""
+    masker = DataMasker()
+
+    assert masker.is_sensitive_value("4111 1111 1111 1111")
+    assert masker.is_sensitive_value("4111-1111-1111-1111")
+    assert masker.is_sensitive_value("550E8400-e29b-41d4-a716-446655440000")
+    assert masker.is_sensitive_value("eyJhbGciOi.eyJzdWIi.c2lnbmF0dXJl")
+    assert not masker.is_sensitive_value("a" * (VALUE_MIN_LENGTH - 1))
+    assert not masker.is_sensitive_value("Pago aprobado correctamente")
+    # Enteros cortos de campos no sensibles se devuelven sin convertir
+    assert masker.mask_value(1234567) == 1234567
+    assert masker.mask_value(4111111111111111) == "4111********1111"
+
+def test_nested_payload_masks_only_changed_paths():
+    """Se enmascaran claves y valores anidados; la entrada no cambia y lo intacto se comparte"""
+    masker = DataMasker()
+    untouched = {"status": "approved", "items": [1, 2, 3]}
+    data = {
+        "payer": {"card": {"card_number": "4111111111111111"}, "name": "Ana"},
+        "metadata": [{"note": "x" * 25}, ("ok", "y" * 25)],
+        "untouched": untouched
+    }
+    original = json.dumps(data)
+
+    masked = masker.mask_sensitive_data(data)
+
+    assert masked["payer"]["card"]["card_number"] == "4111********1111"
+    assert masked["payer"]["name"] == "Ana"
+    assert masked["metadata"][0]["note"] == "xxxx" + "*" * 12 + "xxxx"
+    assert masked["metadata"][1] == ("ok", "yyyy" + "*" * 12 + "yyyy")
+    assert masked["untouched"] is untouched
+    assert json.dumps(data) == original
+
+def test_shared_subtree_is_masked_everywhere():
+    """Un mismo sub-dict referenciado dos veces se enmascara en ambas posiciones"""
+    masker = DataMasker()
+    credentials = {"api_key": "clave-muy-secreta"}
+
+    masked = masker.mask_sensitive_data({"primary": credentials, "backup": credentials})
+
+    assert masked["primary"]["api_key"] == masked["backup"]["api_key"] == "clav*********reta"
+    assert credentials["api_key"] == "clave-muy-secreta"
+
+def test_cyclic_payload_stops_at_max_depth():
+    """Una estructura cíclica termina con el marcador de profundidad en lugar de iterar sin fin"""
+    masker = DataMasker()
+    data = {"status": "approved"}
+    data["self"] = data
+
+    masked = masker.mask_sensitive_data(data, max_depth=5)
+
+    node = masked
+    for _ in range(4):
+        assert node["status"] == "approved"
+        node = node["self"]
+    # En el último nivel todos los valores se reemplazan por el marcador
+    assert node == {"status": MAX_DEPTH_MARKER, "self": MAX_DEPTH_MARKER}
+    assert data["self"] is data
+
+def test_deep_payload_does_not_recurse():
+    """Miles de niveles no agotan la pila: el recorrido es iterativo y corta en max_depth"""
+    masker = DataMasker()
+    data = _nest(5000, "z" * 30)
+
+    masked = masker.mask_sensitive_data(data)
+
+    assert masked == _nest(10, MAX_DEPTH_MARKER)
+    assert masker.mask_sensitive_data("token", max_depth=0) == MAX_DEPTH_MARKER
+
+def test_url_params_with_encoded_separators():
+    """Un & o = codificado no corta el valor; el resto de la URL se conserva byte a byte"""
+    masker = DataMasker()
+    url = "https://example.com/cb?access_token=abc%26def%3Dghi&amount=10&state=a%2Fb#token=frag"
+
+    masked = masker.mask_url_params(url)
+
+    assert masked == "https://example.com/cb?access_token=abc%26***%3Dghi&amount=10&state=a%2Fb#token=frag"
+
+def test_url_params_with_encoded_key_and_no_sensitive_params():
+    """Las claves se comparan decodificadas; sin parámetros sensibles la URL no cambia"""
+    masker = DataMasker()
+
+    assert masker.mask_url_params("/api?api%5Fkey=1234567890&x=1") == "/api?api%5Fkey=1234**7890&x=1"
+    url = "/api/payments?status=approved&page=2&flag"
+    assert masker.mask_url_params(url) == url
+    assert masker.mask_url_params("/api/payments") == "/api/payments"
+
+def test_json_string_keeps_large_integers():
+    """Enteros de 19+ dígitos sobreviven sin pérdida al enmascarar el JSON"""
+    masker = DataMasker()
+    big_id = 9223372036854775808  # 2**63: fuera del rango de 64 bits con signo
+    payload = json.dumps({"id": big_id, "order": 12345678901234567890123, "token": "abcdef123456"})
+
+    masked = json.loads(masker.mask_json_string(payload))
+
+    assert masked["id"] == big_id
+    assert masked["order"] == 12345678901234567890123
+    assert masked["token"] == "abcd****3456"
+
+def test_json_string_unchanged_and_invalid():
+    """JSON sin datos sensibles se devuelve tal cual; lo que no es JSON se trata como texto"""
+    masker = DataMasker()
+    clean = '{"status": "approved", "amount": 10}'
+
+    assert masker.mask_json_string(clean) is clean
+    assert masker.mask_json_string("no es json {") == "no es json {"
+    assert masker.mask_json_string("a" * 30) == "aaaa" + "*" * 12 + "aaaa"
+    assert json.loads(masker.mask_json_string('{"v": NaN, "password": "hunter22"}'))["password"] == "********"
+
+def test_sensitive_data_filter_without_debug():
+    """Sin DEBUG el decorador no registra nada y devuelve el resultado intacto"""
+    result = {"password": "hunter22", "amount": 1}
+
+    returned, records = _call_filtered(logging.INFO, result)
+
+    assert returned is result
+    assert result["password"] == "hunter22"
+    assert records == []
+
+def test_sensitive_data_filter_with_debug():
+    """Con DEBUG el log lleva el resultado enmascarado y el llamador recibe el original"""
+    result = {"password": "hunter22", "amount": 1}
+
+    returned, records = _call_filtered(logging.DEBUG, result)
+
+    assert returned is result
+    assert result["password"] == "hunter22"
+    assert len(records) == 1
+    assert records[0].masked_result == {"password": "********", "amount": 1}
+
+if __name__ == "__main__":
+    tests = [
+        test_every_sensitive_key_class_is_detected,
+        test_regular_fields_are_not_masked,
+        test_sensitive_field_masking_format,
+        test_token_values_at_length_threshold,
+        test_formatted_values_are_detected,
+        test_nested_payload_masks_only_changed_paths,
+        test_shared_subtree_is_masked_everywhere,
+        test_cyclic_payload_stops_at_max_depth,
+        test_deep_payload_does_not_recurse,
+        test_url_params_with_encoded_separators,
+        test_url_params_with_encoded_key_and_no_sensitive_params,
+        test_json_string_keeps_large_integers,
+        test_json_string_unchanged_and_invalid,
+        test_sensitive_data_filter_without_debug,
+        test_sensitive_data_filter_with_debug,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    sys.exit(1 if failed else 0)